@@ -0,0 +1,204 @@
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from generators import (
+    generate_batch_constants,
+    generate_dag,
+    generate_dataset,
+    generate_network,
+    generate_operations,
+    generate_vectors,
+)
+
+TASK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def parse_arguments():
+    args = sys.argv[1:]
+    params = {
+        "output1": "benchmark.json",
+        "sizes": "1000,10000,100000",
+        "widths": "16,64,256",
+        "fan_in": 3,
+        "depth": 10,
+        "vectors": 1000,
+        "samples": 1000,
+        "repeat": 3,
+        "seed": 0,
+        "tasks": "1,2,3,4,5",
+        "compare": None
+    }
+    for arg in args:
+        key, _, value = arg.partition("=")
+        if key in params:
+            params[key] = value.strip()
+    return params
+
+def load_task(number):
+    path = os.path.join(TASK_DIR, f"task-{number}", f"MStask{number}.py")
+    spec = importlib.util.spec_from_file_location(f"MStask{number}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def measure(results, task, phase, size, function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            value = function()
+        timings.append(time.perf_counter() - start)
+    results.append({
+        "task": task,
+        "phase": phase,
+        "size": size,
+        "best": min(timings),
+        "mean": sum(timings) / len(timings),
+        "repeat": repeat,
+    })
+    print(f"{task:8} {phase:22} {size:>10} {min(timings):.6f} с")
+    return value
+
+def benchmark_graphs(results, tasks, sizes, fan_in, depth, repeat, seed):
+    for size in sizes:
+        layers, arcs = generate_dag("graph.txt", size, fan_in, depth, seed)
+        generate_operations("operations.txt", layers, seed)
+        generate_batch_constants("batch.txt", layers[0], 100, seed)
+
+        if 1 in tasks:
+            task = load_task(1)
+            measure(results, "MStask1", "parse", arcs, lambda: task.read_arcs("graph.txt"), repeat)
+            graph = task.validate_and_parse_graph("graph.txt")
+            measure(results, "MStask1", "xml_tree", arcs,
+                    lambda: task.build_xml(graph).write("graph.xml", encoding="utf-8", xml_declaration=True), repeat)
+            measure(results, "MStask1", "xml_stream", arcs, lambda: task.write_xml(graph, "graph.xml"), repeat)
+            measure(results, "MStask1", "xml_read", arcs, lambda: task.read_xml("graph.xml"), repeat)
+
+        if 2 in tasks:
+            task = load_task(2)
+            _, graph, in_degrees, out_degrees = measure(
+                results, "MStask2", "parse", arcs, lambda: task.validate_and_build_graph("graph.txt"), repeat)
+            sinks = task.find_sinks(in_degrees, out_degrees)
+            order, _ = measure(results, "MStask2", "validation", arcs,
+                               lambda: task.topological_order(graph, sinks), repeat)
+            measure(results, "MStask2", "shared_representation", arcs,
+                    lambda: task.write_shared_representation(graph, sinks, order, out_degrees, "function.txt"), repeat)
+
+        if 3 in tasks:
+            task = load_task(3)
+            _, graph, in_degrees, out_degrees = measure(
+                results, "MStask3", "parse", arcs, lambda: task.load_graph("graph.txt"), repeat)
+            operations = task.load_operations("operations.txt")
+            sinks = task.find_sinks(in_degrees, out_degrees)
+            order, _ = measure(results, "MStask3", "validation", arcs,
+                               lambda: task.topological_order(graph, sinks), repeat)
+            measure(results, "MStask3", "evaluation", arcs,
+                    lambda: task.evaluate_expression(graph, operations, sinks, order), repeat)
+            header, constants = task.load_batch("batch.txt")
+            measure(results, "MStask3", "batch_evaluation", arcs,
+                    lambda: task.evaluate_batch_expression(graph, operations, sinks, order, header, constants), repeat)
+
+def benchmark_networks(results, tasks, widths, vectors, samples, repeat, seed):
+    for width in widths:
+        sizes = [width, width, width, 1]
+        parameters = sum(a * b for a, b in zip(sizes, sizes[1:]))
+        generate_network("network.txt", sizes, seed)
+        generate_vectors("vectors.txt", vectors, width, seed)
+        generate_dataset("dataset.txt", samples, width, 1, seed)
+
+        if 4 in tasks:
+            task = load_task(4)
+            layers = measure(results, "MStask4", "parse", parameters, lambda: task.read_matrix("network.txt"), repeat)
+            task.write_binary_weights(layers, "network.nnw")
+            measure(results, "MStask4", "parse_binary", parameters, lambda: task.read_matrix("network.nnw"), repeat)
+            measure(results, "MStask4", "xml_export", parameters,
+                    lambda: task.serialize_to_xml(layers, "network.xml"), repeat)
+            input_vectors = task.read_vectors("vectors.txt")
+            inputs, weights = task.build_layers(layers, input_vectors)
+            measure(results, "MStask4", "inference", parameters, lambda: task.calculate(weights, inputs), repeat)
+            fast = task.resolve_activations("sigmoid", "fast", len(weights))
+            measure(results, "MStask4", "inference_fast", parameters,
+                    lambda: task.calculate(weights, inputs, fast), repeat)
+
+        if 5 in tasks:
+            task = load_task(5)
+            weights = measure(results, "MStask5", "parse", parameters, lambda: task.read_matrix("network.txt"), repeat)
+            dataset = task.load_dataset("dataset.txt", 0)
+            for kernel, phase in (("exact", "epoch"), ("fast", "epoch_fast")):
+                weights = task.read_matrix("network.txt")
+                optimizer = task.create_optimizer("sgd", weights)
+                kernels = task.resolve_activations("sigmoid", kernel, len(weights))
+                buffer_cache = {}
+
+                def epoch():
+                    for inputs, targets in task.iter_training_batches(dataset, 0):
+                        task.train_step(weights, inputs, targets, 0.01, optimizer, buffer_cache, kernels)
+
+                measure(results, "MStask5", phase, parameters, epoch, repeat)
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=TASK_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def compare_reports(baseline_path, results):
+    with open(baseline_path, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    previous = {(r["task"], r["phase"], r["size"]): r["best"] for r in baseline["results"]}
+    print(f"Сравнение с {baseline_path} ({baseline.get('commit')}):")
+    for result in results:
+        key = (result["task"], result["phase"], result["size"])
+        if key in previous and result["best"] > 0:
+            print(f"{key[0]:8} {key[1]:22} {key[2]:>10} x{previous[key] / result['best']:.2f}")
+
+def main():
+    params = parse_arguments()
+    tasks = {int(task) for task in params["tasks"].split(",")}
+    repeat = int(params["repeat"])
+    seed = int(params["seed"])
+    output_path = os.path.abspath(params["output1"])
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            benchmark_graphs(
+                results, tasks, [int(size) for size in params["sizes"].split(",")],
+                int(params["fan_in"]), int(params["depth"]), repeat, seed
+            )
+            benchmark_networks(
+                results, tasks, [int(width) for width in params["widths"].split(",")],
+                int(params["vectors"]), int(params["samples"]), repeat, seed
+            )
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "params": params,
+        "results": results,
+    }
+    with open(output_path, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"Результаты замеров сохранены в {output_path}.")
+
+    if params["compare"]:
+        compare_reports(params["compare"], results)
+
+if __name__ == "__main__":
+    main()
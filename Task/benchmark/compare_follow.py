@@ -0,0 +1,217 @@
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+TASK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CYCLE_ERROR = "Ошибка: граф содержит циклы. Цикл: "
+
+def parse_arguments():
+    args = sys.argv[1:]
+    params = {
+        "runs": 50,
+        "vertices": 12,
+        "batches": 8,
+        "seed": 0,
+        "tasks": "2,3",
+        "format": "flat"
+    }
+    for arg in args:
+        key, _, value = arg.partition("=")
+        if key in params:
+            params[key] = value.strip()
+    return params
+
+def format_arcs(arcs):
+    return ", ".join(f"({a}, {b}, {n})" for a, b, n in arcs)
+
+def generate_stream(rng, vertices, batches):
+    # Дуги каждой вершины выдаются по возрастанию номера, поэтому любой префикс потока — корректный граф.
+    # В пакеты подмешиваются повторы дуг и номеров, разрывы номеров, петли и обратные дуги, замыкающие циклы.
+    pending = {}
+    for b in range(2, vertices + 1):
+        sources = rng.sample(range(1, b), rng.randint(0, min(3, b - 1)))
+        if sources:
+            pending[b] = [(a, b, n) for n, a in enumerate(sources, 1)]
+    # В половине потоков вершины достраиваются по порядку и успевают получить все аргументы до того, как
+    # сами станут аргументом; в остальных дуги перемешаны и порядок приходится перестраивать
+    ordered = rng.random() < 0.5
+    stream = []
+    while pending:
+        b = min(pending) if ordered else rng.choice(list(pending))
+        stream.append(pending[b].pop(0))
+        if not pending[b]:
+            del pending[b]
+    split = rng.randint(1, max(1, len(stream) // 2))
+    initial, rest = stream[:split], stream[split:]
+
+    bounds = sorted(rng.sample(range(1, len(rest)), min(batches - 1, max(0, len(rest) - 1)))) if rest else []
+    chunks = [rest[start:end] for start, end in zip([0] + bounds, bounds + [len(rest)])]
+    emitted = list(initial)
+    result = []
+    for chunk in chunks:
+        chunk = list(chunk)
+        if rng.random() < 0.3:
+            a, b, n = rng.choice(emitted + chunk)
+            chunk.insert(rng.randint(0, len(chunk)), rng.choice([
+                (a, b, n + 1),
+                (rng.randint(1, vertices), b, n),
+                (a, b, n + 2),
+                (b, a, 1),
+                (a, a, 1),
+            ]))
+        emitted += chunk
+        result.append(chunk)
+    return initial, result
+
+def generate_operations(rng, vertices, arcs):
+    # Вершины с аргументами получают операции, листья — константы. Часть листьев остаётся без операции
+    # или получает операцию без аргументов: полный проход и сессия должны сообщить одну и ту же первую ошибку
+    targets = {b for _, b, _ in arcs}
+    lines = []
+    for vertex in range(1, vertices + 1):
+        if vertex in targets:
+            operation = rng.choice(["+", "*", "+", "exp"])
+        elif rng.random() < 0.85:
+            operation = str(rng.randint(1, 3))
+        elif rng.random() < 0.5:
+            continue
+        else:
+            operation = "+"
+        lines.append(f"{vertex}: {operation}")
+    return "\n".join(lines)
+
+def has_cycle(arcs):
+    parents = {}
+    for a, b, _ in arcs:
+        parents.setdefault(a, []).append(b)
+    state = {}
+    for root in parents:
+        if root in state:
+            continue
+        state[root] = 1
+        stack = [(root, iter(parents[root]))]
+        while stack:
+            vertex, children = stack[-1]
+            for child in children:
+                if state.get(child) == 1:
+                    return True
+                if child not in state:
+                    state[child] = 1
+                    stack.append((child, iter(parents.get(child, []))))
+                    break
+            else:
+                state[vertex] = 2
+                stack.pop()
+    return False
+
+def accepted(arcs):
+    # Пакет принимается целиком, если после него нет повторов дуг и номеров и не появился цикл
+    return (len({(a, b) for a, b, _ in arcs}) == len(arcs)
+            and len({(b, n) for _, b, n in arcs}) == len(arcs)
+            and not has_cycle(arcs))
+
+def is_cycle(message, arcs):
+    if not message.startswith(CYCLE_ERROR):
+        return False
+    cycle = [int(vertex) for vertex in message[len(CYCLE_ERROR):].split(" -> ")]
+    edges = {(a, b) for a, b, _ in arcs}
+    return cycle[0] == cycle[-1] and all(edge in edges for edge in zip(cycle, cycle[1:]))
+
+def run_task(task, *args):
+    if os.path.exists("error.txt"):
+        os.remove("error.txt")
+    script = os.path.join(TASK_DIR, f"task-{task}", f"MStask{task}.py")
+    process = subprocess.run([sys.executable, script, *args], capture_output=True, text=True)
+    if process.returncode:
+        lines = process.stderr.strip().splitlines()
+        return lines[-1] if lines else f"код завершения {process.returncode}"
+    return None
+
+def read_file(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return file.read()
+
+def write_file(path, content):
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(content)
+
+def fresh_result(task, arcs, representation_format):
+    # Эталон: отдельный запуск без follow= на всех дугах, которые должен видеть follow после пакета
+    write_file("fresh_input.txt", format_arcs(arcs))
+    if task == 2:
+        failure = run_task(2, "input1=fresh_input.txt", "output1=fresh.txt", f"format={representation_format}")
+    else:
+        failure = run_task(3, "input1=fresh_input.txt", "input2=operations.txt", "output1=fresh.txt")
+    if failure:
+        return f"полный проход завершился с ошибкой: {failure}", None
+    if os.path.exists("error.txt"):
+        return read_file("error.txt"), None
+    result = read_file("fresh.txt")
+    return ("Функция успешно сохранена в follow.txt." if task == 2 else result), result
+
+def compare_run(task, rng, vertices, batches, representation_format):
+    initial, stream = generate_stream(rng, vertices, batches)
+    write_file("input.txt", format_arcs(initial))
+    write_file("batches.txt", "\n".join(format_arcs(arcs) for arcs in stream) + "\n")
+    write_file("operations.txt", generate_operations(rng, vertices, initial + [arc for arcs in stream for arc in arcs]))
+    if task == 2:
+        failure = run_task(2, "input1=input.txt", "output1=follow.txt", "output2=status.txt",
+                           "follow=batches.txt", f"format={representation_format}")
+    else:
+        failure = run_task(3, "input1=input.txt", "input2=operations.txt", "output1=follow.txt",
+                           "output2=status.txt", "follow=batches.txt")
+    if failure:
+        return [f"follow завершился с ошибкой: {failure}"]
+    statuses = read_file("status.txt").splitlines()
+    if len(statuses) != len(stream):
+        return [f"ожидалось {len(stream)} строк состояния, получено {len(statuses)}"]
+
+    mismatches = []
+    graph = list(initial)
+    last_output = None
+    for i, (arcs, status) in enumerate(zip(stream, statuses)):
+        candidate = graph + arcs
+        expected, output = fresh_result(task, candidate, representation_format)
+        if output is not None:
+            last_output = output
+        if accepted(candidate):
+            graph = candidate
+        if status != expected and not (is_cycle(status, candidate) and expected.startswith(CYCLE_ERROR)):
+            mismatches.append(f"пакет {i + 1} {format_arcs(arcs)}: follow «{status}», полный проход «{expected}»")
+    if last_output is not None and read_file("follow.txt") != last_output:
+        mismatches.append("итоговый output1 follow отличается от полного прохода")
+    return mismatches
+
+def main():
+    params = parse_arguments()
+    tasks = [int(task) for task in params["tasks"].split(",")]
+    runs, seed = int(params["runs"]), int(params["seed"])
+
+    failed = 0
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            for task in tasks:
+                for run in range(runs):
+                    rng = random.Random(f"{seed}:{task}:{run}")
+                    mismatches = compare_run(task, rng, int(params["vertices"]), int(params["batches"]), params["format"])
+                    if mismatches:
+                        failed += 1
+                        print(f"MStask{task}, запуск {run} (seed={seed}):")
+                        for mismatch in mismatches:
+                            print(f"  {mismatch}")
+                        print(f"  входной граф: {read_file('input.txt')}")
+                print(f"MStask{task}: {runs} случайных потоков follow= сверены с полным проходом")
+        finally:
+            os.chdir(cwd)
+
+    if failed:
+        print(f"Расхождений: {failed}")
+        sys.exit(1)
+    print("Расхождений нет.")
+
+if __name__ == "__main__":
+    main()
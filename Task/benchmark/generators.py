@@ -0,0 +1,63 @@
+import random
+import numpy as np
+
+def generate_dag(file_path, vertices, fan_in=3, depth=10, seed=0):
+    rng = random.Random(seed)
+    depth = max(2, min(depth, vertices))
+    layers = [[] for _ in range(depth)]
+    for vertex in range(1, vertices + 1):
+        layers[(vertex - 1) * depth // vertices].append(vertex)
+
+    arcs = 0
+    with open(file_path, "w", encoding="utf-8") as file:
+        separator = ""
+        for level in range(1, depth):
+            previous = layers[level - 1]
+            for b in layers[level]:
+                sources = rng.sample(previous, min(fan_in, len(previous)))
+                for n, a in enumerate(sources, 1):
+                    file.write(f"{separator}({a}, {b}, {n})")
+                    separator = ",\n" if arcs % 8 == 7 else ", "
+                    arcs += 1
+    return layers, arcs
+
+def generate_operations(file_path, layers, seed=0):
+    rng = random.Random(seed)
+    with open(file_path, "w", encoding="utf-8") as file:
+        for vertex in layers[0]:
+            file.write(f"{vertex}: {rng.randint(1, 9)}\n")
+        for level, vertices in enumerate(layers[1:], 1):
+            for vertex in vertices:
+                if level == 1 and rng.random() < 0.1:
+                    operation = "exp"
+                else:
+                    operation = "+" if rng.random() < 0.6 else "*"
+                file.write(f"{vertex}: {operation}\n")
+
+def generate_batch_constants(file_path, leaves, rows, seed=0):
+    constants = np.random.default_rng(seed).uniform(0, 1, (rows, len(leaves)))
+    with open(file_path, "w", encoding="utf-8") as file:
+        file.write(" ".join(map(str, leaves)) + "\n")
+        for row in constants.tolist():
+            file.write(" ".join(map(str, row)) + "\n")
+
+def generate_network(file_path, sizes, seed=0):
+    rng = np.random.default_rng(seed)
+    with open(file_path, "w", encoding="utf-8") as file:
+        for inputs, outputs in zip(sizes, sizes[1:]):
+            layer = rng.uniform(-1, 1, (outputs, inputs)).tolist()
+            file.write(" ".join("[" + " ".join(map(str, neuron)) + "]" for neuron in layer) + "\n")
+
+def generate_vectors(file_path, count, width, seed=0):
+    vectors = np.random.default_rng(seed).uniform(0, 1, (count, width))
+    with open(file_path, "w", encoding="utf-8") as file:
+        for vector in vectors.tolist():
+            file.write(" ".join(map(str, vector)) + "\n")
+
+def generate_dataset(file_path, rows, inputs, outputs, seed=0):
+    rng = np.random.default_rng(seed)
+    samples = rng.uniform(0, 1, (rows, inputs))
+    targets = (samples[:, :outputs] > 0.5).astype(int) if outputs <= inputs else rng.integers(0, 2, (rows, outputs))
+    with open(file_path, "w", encoding="utf-8") as file:
+        for sample, target in zip(samples.tolist(), targets.tolist()):
+            file.write(f"[{' '.join(map(str, sample))}] [{' '.join(map(str, target))}]\n")
@@ -0,0 +1,117 @@
+import numpy as np
+
+# Функции активации принимают необязательные out= и scratch=: обучение передаёт заранее выделенные буферы,
+# вывод сети вызывает их без буферов. ACTIVATIONS хранит пары (функция, производная по выходу слоя)
+
+def sigmoid(x, out=None, scratch=None):
+    if out is None:
+        with np.errstate(over="ignore"):
+            return 1 / (1 + np.exp(-x))
+    np.negative(x, out=out)
+    np.exp(out, out=out)
+    np.add(out, 1, out=out)
+    return np.divide(1, out, out=out)
+
+def sigmoid_derivative(y, out=None, scratch=None):
+    # Как и в исходной версии, сигмоида повторно применяется к выходу слоя y:
+    # формула сохранена, чтобы обучение по умолчанию давало прежние результаты
+    if out is None:
+        s = sigmoid(y)
+        return s * (1 - s)
+    sigmoid(y, out=out)
+    np.subtract(1, out, out=scratch)
+    return np.multiply(out, scratch, out=out)
+
+def float32_workspace(x, scratch=None):
+    if scratch is None:
+        return np.empty(x.shape, dtype=np.float32)
+    return scratch.reshape(-1).view(np.float32)[:x.size].reshape(x.shape)
+
+def fast_sigmoid(x, out=None, scratch=None):
+    # sigmoid(x) = (1 + tanh(x / 2)) / 2 с tanh во float32: SIMD-ядро быстрее экспоненты во float64,
+    # tanh насыщается без переполнения, погрешность порядка 1e-7
+    if out is None:
+        out = np.empty_like(x)
+    workspace = float32_workspace(x, scratch)
+    np.multiply(x, 0.5, out=workspace, casting="same_kind")
+    np.tanh(workspace, out=workspace)
+    np.multiply(workspace, 0.5, out=workspace)
+    return np.add(workspace, 0.5, out=out)
+
+def fast_sigmoid_derivative(y, out=None, scratch=None):
+    # Та же формула, что и в sigmoid_derivative: для s = (1 + tanh(y / 2)) / 2 произведение s * (1 - s)
+    # равно (1 - tanh²(y / 2)) / 4, и все промежуточные проходы остаются во float32
+    if out is None:
+        out = np.empty_like(y)
+    workspace = float32_workspace(y, scratch)
+    np.multiply(y, 0.5, out=workspace, casting="same_kind")
+    np.tanh(workspace, out=workspace)
+    np.multiply(workspace, workspace, out=workspace)
+    np.subtract(1, workspace, out=workspace)
+    return np.multiply(workspace, 0.25, out=out)
+
+def tanh(x, out=None, scratch=None):
+    return np.tanh(x, out=out)
+
+def fast_tanh(x, out=None, scratch=None):
+    if out is None:
+        out = np.empty_like(x)
+    workspace = float32_workspace(x, scratch)
+    np.copyto(workspace, x, casting="same_kind")
+    np.tanh(workspace, out=workspace)
+    np.copyto(out, workspace)
+    return out
+
+def tanh_derivative(y, out=None, scratch=None):
+    # Производные tanh и ReLU выражаются через уже вычисленный выход слоя без повторных экспонент
+    if out is None:
+        return 1 - y * y
+    np.multiply(y, y, out=out)
+    return np.subtract(1, out, out=out)
+
+def relu(x, out=None, scratch=None):
+    return np.maximum(x, 0, out=out)
+
+def relu_derivative(y, out=None, scratch=None):
+    if out is None:
+        return (y > 0).astype(y.dtype)
+    return np.greater(y, 0, out=out)
+
+LEAKY_SLOPE = 0.01
+
+def leaky_relu(x, out=None, scratch=None):
+    return np.maximum(x, np.multiply(x, LEAKY_SLOPE), out=out)
+
+def leaky_relu_derivative(y, out=None, scratch=None):
+    if out is None:
+        return np.where(y > 0, 1.0, LEAKY_SLOPE).astype(y.dtype)
+    np.greater(y, 0, out=out)
+    np.multiply(out, 1 - LEAKY_SLOPE, out=out)
+    return np.add(out, LEAKY_SLOPE, out=out)
+
+ACTIVATIONS = {
+    "sigmoid": (sigmoid, sigmoid_derivative),
+    "tanh": (tanh, tanh_derivative),
+    "relu": (relu, relu_derivative),
+    "leaky_relu": (leaky_relu, leaky_relu_derivative),
+}
+
+# Приближённые ядра есть только у функций с экспонентой; ReLU и leaky ReLU и так сводятся к сравнениям
+FAST_ACTIVATIONS = {
+    "sigmoid": (fast_sigmoid, fast_sigmoid_derivative),
+    "tanh": (fast_tanh, tanh_derivative),
+}
+
+def resolve_activations(spec, kernel, layers):
+    names = [name.strip() for name in spec.split(",")]
+    if len(names) == 1:
+        names *= layers
+    if len(names) != layers:
+        raise ValueError(f"задано {len(names)} функций активации для {layers} слоёв")
+    for name in names:
+        if name not in ACTIVATIONS:
+            raise ValueError(f"неизвестная функция активации '{name}'")
+    if kernel not in ("exact", "fast"):
+        raise ValueError(f"неизвестный вариант ядра '{kernel}'")
+    kernels = FAST_ACTIVATIONS if kernel == "fast" else ACTIVATIONS
+    return [kernels.get(name, ACTIVATIONS[name]) for name in names]
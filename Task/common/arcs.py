@@ -0,0 +1,159 @@
+import mmap
+import os
+import re
+import struct
+from array import array
+from itertools import chain
+
+import numpy as np
+
+from common.cache import PARSER_VERSION, file_digest, store_cache_entry, touch_cache_entry
+
+CHUNK_SIZE = 1 << 16
+ARC_PATTERN = re.compile(r"\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\)")
+ARC_PREFIX_PATTERN = re.compile(r"\(\s*(?:\d+\s*(?:,\s*(?:\d+\s*(?:,\s*(?:\d+\s*)?)?)?)?)?")
+
+def iter_arcs(file, chunk_size=CHUNK_SIZE):
+    tail = ""
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        buffer = tail + chunk.replace("\n", "")
+        end = 0
+        for match in ARC_PATTERN.finditer(buffer):
+            yield int(match.group(1)), int(match.group(2)), int(match.group(3))
+            end = match.end()
+        # Незавершённая тройка может начинаться только с последней "(" после совпадений. Хвост переносится,
+        # только если он ещё может стать тройкой: иначе одна лишняя "(" тянула бы за собой весь файл
+        start = buffer.rfind("(", end)
+        tail = buffer[start:] if start != -1 and ARC_PREFIX_PATTERN.fullmatch(buffer, start) else ""
+
+def first_repeat(primary, secondary):
+    # Устойчивая сортировка оставляет первое вхождение пары первым, повторы идут за ним.
+    # Возвращается наименьший исходный индекс повтора, то есть первое нарушение в порядке файла.
+    order = np.lexsort((secondary, primary))
+    repeated = (primary[order[1:]] == primary[order[:-1]]) & (secondary[order[1:]] == secondary[order[:-1]])
+    return int(order[1:][repeated].min()) if repeated.any() else len(primary)
+
+def first_sequence_gap(targets, orders):
+    # Номера дуг вершины без повторов образуют 1..k ровно тогда, когда после сортировки n равен рангу в группе
+    order = np.lexsort((orders, targets))
+    sorted_targets = targets[order]
+    boundaries = np.concatenate(([True], sorted_targets[1:] != sorted_targets[:-1]))
+    group_starts = np.flatnonzero(boundaries)
+    group_ids = np.cumsum(boundaries) - 1
+    mismatched = np.flatnonzero(orders[order] != np.arange(1, len(order) + 1) - group_starts[group_ids])
+    if not mismatched.size:
+        return None
+    # Вершины проверяются в порядке их первого появления в файле
+    first_seen = np.minimum.reduceat(order, group_starts)
+    return int(targets[first_seen[group_ids[mismatched]].min()])
+
+def collect_large_arcs(arcs):
+    # Номера вне диапазона int64 не помещаются в упакованные столбцы: такие файлы проверяются
+    # на множествах Python, как в исходной версии, а столбцы остаются списками
+    sources, targets, orders = [], [], []
+    unique_edges = set()
+    order_check = {}
+    for a, b, n in arcs:
+        edge = (a, b)
+        if edge in unique_edges:
+            return f"Ошибка: повторяющаяся дуга между вершинами ({a}, {b})", None, None, None
+        unique_edges.add(edge)
+
+        if b not in order_check:
+            order_check[b] = set()
+        if n in order_check[b]:
+            return f"Ошибка: повторяющийся номер дуги {n} для вершины {b}", None, None, None
+        order_check[b].add(n)
+
+        sources.append(a)
+        targets.append(b)
+        orders.append(n)
+
+    for vertex, numbers in order_check.items():
+        if sorted(numbers) != list(range(1, len(numbers) + 1)):
+            return f"Ошибка: у вершины {vertex} нарушена последовательность номеров дуг", None, None, None
+
+    return None, sources, targets, orders
+
+def collect_arcs(arcs):
+    sources, targets, orders = array("q"), array("q"), array("q")
+    arcs = iter(arcs)
+    for a, b, n in arcs:
+        try:
+            sources.append(a)
+            targets.append(b)
+            orders.append(n)
+        except OverflowError:
+            # Столбцы могли успеть принять часть тройки: полностью записаны только первые len(orders) дуг
+            count = len(orders)
+            collected = zip(sources[:count], targets[:count], orders[:count])
+            return collect_large_arcs(chain(collected, [(a, b, n)], arcs))
+
+    if len(sources) == 0:
+        return f"Ошибка: неверные данные во входном файле", None, None, None
+
+    # Проверки идут по упакованным столбцам без копирования, память пропорциональна самим дугам
+    a_values, b_values, n_values = (np.frombuffer(values, dtype=np.int64) for values in (sources, targets, orders))
+    edge = first_repeat(b_values, a_values)
+    number = first_repeat(b_values, n_values)
+    if edge < len(sources) and edge <= number:
+        return f"Ошибка: повторяющаяся дуга между вершинами ({sources[edge]}, {targets[edge]})", None, None, None
+    if number < len(sources):
+        return f"Ошибка: повторяющийся номер дуги {orders[number]} для вершины {targets[number]}", None, None, None
+
+    vertex = first_sequence_gap(b_values, n_values)
+    if vertex is not None:
+        return f"Ошибка: у вершины {vertex} нарушена последовательность номеров дуг", None, None, None
+
+    return None, sources, targets, orders
+
+def read_arcs(file_path, chunk_size=CHUNK_SIZE):
+    with open(file_path, "r", encoding="utf-8") as file:
+        return collect_arcs(iter_arcs(file, chunk_size))
+
+ARC_CACHE_MAGIC = b"NNWA"
+ARC_CACHE_HEADER = struct.Struct("<4sIQ")
+
+def write_arc_cache(path, sources, targets, orders):
+    with open(path, "wb") as file:
+        file.write(ARC_CACHE_HEADER.pack(ARC_CACHE_MAGIC, PARSER_VERSION, len(sources)))
+        for values in (sources, targets, orders):
+            values.tofile(file)
+
+def read_arc_cache(path):
+    # Пустая, обрезанная или чужая запись считается промахом: файл разбирается заново, запись перезаписывается
+    try:
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if len(data) < ARC_CACHE_HEADER.size:
+                return None
+            magic, version, count = ARC_CACHE_HEADER.unpack_from(data)
+            size = count * array("q").itemsize
+            if (magic != ARC_CACHE_MAGIC or version != PARSER_VERSION or count == 0
+                    or len(data) != ARC_CACHE_HEADER.size + 3 * size):
+                return None
+            arcs = []
+            with memoryview(data) as view:
+                for start in range(ARC_CACHE_HEADER.size, len(data), size):
+                    values = array("q")
+                    values.frombytes(view[start:start + size])
+                    arcs.append(values)
+            return arcs
+    except (OSError, ValueError):
+        return None
+
+def read_cached_arcs(file_path, reader, kind, cache_dir, cache_size):
+    key = file_digest(file_path, kind)
+    path = os.path.join(cache_dir, f"{key}.arcs")
+    if touch_cache_entry(path):
+        arcs = read_arc_cache(path)
+        if arcs is not None:
+            return None, *arcs
+    error, sources, targets, orders = reader(file_path)
+    if error is None and isinstance(sources, array):
+        store_cache_entry(
+            cache_dir, path, lambda temporary: write_arc_cache(temporary, sources, targets, orders), cache_size
+        )
+    return error, sources, targets, orders
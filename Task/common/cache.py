@@ -0,0 +1,48 @@
+import hashlib
+import os
+
+PARSER_VERSION = 1
+CACHE_SIZE = 256 << 20
+
+def file_digest(file_path, kind):
+    # Ключ кэша зависит только от содержимого файла, вида разбора и версии разборщика
+    digest = hashlib.blake2b(f"{kind}:{PARSER_VERSION}:".encode("ascii"), digest_size=20)
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def touch_cache_entry(path):
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+def evict_cache(cache_dir, cache_size):
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and not entry.name.endswith(".tmp"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= cache_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def store_cache_entry(cache_dir, path, write, cache_size):
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        write(temporary)
+        os.replace(temporary, path)
+        evict_cache(cache_dir, cache_size)
+    except (OSError, ValueError) as e:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        print(f"Не удалось сохранить результат разбора в кэш: {e}")
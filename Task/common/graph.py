@@ -0,0 +1,30 @@
+from itertools import chain
+
+def find_sinks(in_degrees, out_degrees):
+    return [node for node in in_degrees if node not in out_degrees]
+
+def topological_order(graph, roots=()):
+    state = {}
+    order = []
+    for root in chain(roots, graph):
+        if root in state:
+            continue
+        state[root] = 1
+        path = [root]
+        stack = [iter(graph.get(root, []))]
+        while stack:
+            for child, _ in stack[-1]:
+                if state.get(child) == 1:
+                    cycle = path[path.index(child):] + [child]
+                    return None, cycle[::-1]
+                if child not in state:
+                    state[child] = 1
+                    path.append(child)
+                    stack.append(iter(graph.get(child, [])))
+                    break
+            else:
+                stack.pop()
+                vertex = path.pop()
+                state[vertex] = 2
+                order.append(vertex)
+    return order, None
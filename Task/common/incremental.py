@@ -0,0 +1,227 @@
+import sys
+from bisect import insort
+from heapq import heapify, heappop, heappush
+from itertools import chain
+
+from common.arcs import ARC_PATTERN
+
+def incremental_graph(graph, in_degrees, out_degrees, order):
+    # Дуга (a, b, n) направлена от аргумента a к вершине b; position хранит текущий топологический номер
+    parents = {}
+    edges = set()
+    numbers = {}
+    for b, children in graph.items():
+        numbers[b] = {n for _, n in children}
+        for a, _ in children:
+            parents.setdefault(a, []).append(b)
+            edges.add((a, b))
+    return {
+        "graph": graph,
+        "parents": parents,
+        "in_degrees": in_degrees,
+        "out_degrees": out_degrees,
+        "edges": edges,
+        "numbers": numbers,
+        "maxima": {b: max(values) for b, values in numbers.items()},
+        "gaps": set(),
+        "position": {vertex: i for i, vertex in enumerate(order)},
+        # Стоки хранятся вместе с порядковым номером вершины в in_degrees, чтобы выдавать их в порядке find_sinks
+        "targets": {vertex: i for i, vertex in enumerate(in_degrees)},
+        "sinks": {vertex for vertex in in_degrees if vertex not in out_degrees},
+        "next_target": len(in_degrees),
+        "first": -1,
+        "next": len(order),
+    }
+
+def update_sequence(state, b):
+    numbers = state["numbers"].get(b)
+    if not numbers:
+        state["maxima"].pop(b, None)
+        state["gaps"].discard(b)
+        return
+    # Различные номера образуют 1..k ровно тогда, когда среди них нет нуля и максимум равен k
+    if 0 in numbers or state["maxima"][b] != len(numbers):
+        state["gaps"].add(b)
+    else:
+        state["gaps"].discard(b)
+
+def reorder(state, a, b):
+    # Динамический топологический порядок (Pearce, Kelly): перестраивается только участок между b и a
+    position, parents, graph = state["position"], state["parents"], state["graph"]
+    lower, upper = position[b], position[a]
+    if lower > upper:
+        return None
+
+    previous = {b: None}
+    stack = [b]
+    while stack:
+        vertex = stack.pop()
+        for parent in parents.get(vertex, ()):
+            if parent == a:
+                path = []
+                while vertex is not None:
+                    path.append(vertex)
+                    vertex = previous[vertex]
+                return path[::-1] + [a, b]
+            if parent not in previous and position[parent] < upper:
+                previous[parent] = vertex
+                stack.append(parent)
+    forward = list(previous)
+
+    backward = {a}
+    stack = [a]
+    while stack:
+        vertex = stack.pop()
+        for child, _ in graph.get(vertex, ()):
+            if child not in backward and position[child] > lower:
+                backward.add(child)
+                stack.append(child)
+
+    moved = sorted(backward, key=position.get) + sorted(forward, key=position.get)
+    for vertex, index in zip(moved, sorted(position[vertex] for vertex in moved)):
+        position[vertex] = index
+    return None
+
+def add_arc(state, a, b, n):
+    if a == b:
+        return f"Ошибка: граф содержит циклы. Цикл: {a} -> {b}"
+
+    position = state["position"]
+    if a not in position:
+        # Новый аргумент ставится в начало порядка, новая вершина — в конец: перестановка не нужна
+        position[a] = state["first"]
+        state["first"] -= 1
+    if b not in position:
+        position[b] = state["next"]
+        state["next"] += 1
+    cycle = reorder(state, a, b)
+    if cycle:
+        discard_vertex(state, a)
+        discard_vertex(state, b)
+        return f"Ошибка: граф содержит циклы. Цикл: {' -> '.join(map(str, cycle))}"
+
+    state["edges"].add((a, b))
+    insort(state["graph"].setdefault(b, []), (a, n), key=lambda x: x[1])
+    state["parents"].setdefault(a, []).append(b)
+    if b not in state["in_degrees"]:
+        state["targets"][b] = state["next_target"]
+        state["next_target"] += 1
+        if b not in state["out_degrees"]:
+            state["sinks"].add(b)
+    state["in_degrees"][b] = state["in_degrees"].get(b, 0) + 1
+    state["out_degrees"][a] = state["out_degrees"].get(a, 0) + 1
+    state["sinks"].discard(a)
+    state["numbers"].setdefault(b, set()).add(n)
+    state["maxima"][b] = max(state["maxima"].get(b, 0), n)
+    update_sequence(state, b)
+    return None
+
+def discard_vertex(state, vertex):
+    if vertex not in state["graph"] and not state["parents"].get(vertex):
+        state["position"].pop(vertex, None)
+
+def remove_arc(state, a, b, n):
+    state["edges"].discard((a, b))
+    children = state["graph"][b]
+    children.remove((a, n))
+    if not children:
+        del state["graph"][b]
+    state["parents"][a].remove(b)
+    if not state["parents"][a]:
+        del state["parents"][a]
+    for degrees, vertex in ((state["in_degrees"], b), (state["out_degrees"], a)):
+        degrees[vertex] -= 1
+        if not degrees[vertex]:
+            del degrees[vertex]
+    if b not in state["in_degrees"]:
+        del state["targets"][b]
+        state["sinks"].discard(b)
+    if a not in state["out_degrees"] and a in state["in_degrees"]:
+        state["sinks"].add(a)
+    state["numbers"][b].discard(n)
+    if state["numbers"][b]:
+        state["maxima"][b] = max(state["numbers"][b])
+    else:
+        del state["numbers"][b]
+    update_sequence(state, b)
+    # Удаление дуги не нарушает топологический порядок, убираются только опустевшие вершины
+    discard_vertex(state, a)
+    discard_vertex(state, b)
+
+def duplicate_error(state, arcs):
+    edges, numbers = set(), set()
+    for a, b, n in arcs:
+        if (a, b) in state["edges"] or (a, b) in edges:
+            return f"Ошибка: повторяющаяся дуга между вершинами ({a}, {b})"
+        if n in state["numbers"].get(b, ()) or (b, n) in numbers:
+            return f"Ошибка: повторяющийся номер дуги {n} для вершины {b}"
+        edges.add((a, b))
+        numbers.add((b, n))
+    return None
+
+def sequence_error(state, arcs=()):
+    # Разрывы в номерах графа, каким он стал бы после добавления пакета arcs
+    numbers = {}
+    for _, b, n in arcs:
+        numbers.setdefault(b, set(state["numbers"].get(b, ()))).add(n)
+    gaps = state["gaps"].difference(numbers)
+    gaps.update(b for b, values in numbers.items() if 0 in values or max(values) != len(values))
+    if gaps:
+        vertex = next(vertex for vertex in chain(state["in_degrees"], numbers) if vertex in gaps)
+        return f"Ошибка: у вершины {vertex} нарушена последовательность номеров дуг"
+    return None
+
+def add_arcs(state, arcs):
+    # Пакет добавляется целиком или не добавляется вовсе. Ошибки сообщаются в порядке полного прохода:
+    # повторы по всему пакету, затем разрывы номеров и только потом циклы
+    error = duplicate_error(state, arcs)
+    if error:
+        return error
+    added = []
+    for a, b, n in arcs:
+        error = add_arc(state, a, b, n)
+        if error:
+            for arc in reversed(added):
+                remove_arc(state, *arc)
+            return sequence_error(state, arcs) or error
+        added.append((a, b, n))
+    return None
+
+def graph_error(state):
+    if not state["edges"]:
+        return f"Ошибка: неверные данные во входном файле"
+    return sequence_error(state)
+
+def current_sinks(state):
+    # То же, что find_sinks на текущем графе, но без обхода всех вершин: сортируются только стоки
+    return sorted(state["sinks"], key=state["targets"].get)
+
+def propagate(state, dirty, update):
+    # Вершины обходятся по возрастанию топологического номера, поэтому их аргументы уже обновлены.
+    # Родители попадают в очередь, только если update сообщил об изменении вершины.
+    position, parents = state["position"], state["parents"]
+    queued = set(dirty)
+    heap = [(position[vertex], vertex) for vertex in queued]
+    heapify(heap)
+    count = 0
+    while heap:
+        _, vertex = heappop(heap)
+        count += 1
+        if update(vertex):
+            for parent in parents.get(vertex, ()):
+                if parent not in queued:
+                    queued.add(parent)
+                    heappush(heap, (position[parent], parent))
+    return count
+
+def read_follow_batches(source):
+    # Каждая непустая строка источника — пакет дуг в формате входного файла
+    input_file = sys.stdin if source == "-" else open(source, "r", encoding="utf-8")
+    try:
+        for line in input_file:
+            arcs = [(int(a), int(b), int(n)) for a, b, n in ARC_PATTERN.findall(line)]
+            if arcs:
+                yield arcs
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
@@ -0,0 +1,20 @@
+import json
+import os
+
+import numpy as np
+
+DTYPES = ("float64", "float32", "float16")
+
+def compute_dtype(dtype):
+    # float16 хранится компактно, но умножение и накопление сумм идут во float32
+    return np.promote_types(dtype, np.float32)
+
+def write_precision_report(report, output_path):
+    report_path = f"{os.path.splitext(output_path)[0]}.precision.json"
+    with open(report_path, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    message = (f"Отчёт о точности {report['dtype']}/{report['kernel']} относительно float64 записан в {report_path}: "
+               f"максимальная ошибка {report['max_abs_error']}")
+    if "loss_gap" in report:
+        message += f", разница ошибок обучения {report['loss_gap']}"
+    print(message)
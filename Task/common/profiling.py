@@ -0,0 +1,99 @@
+import atexit
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+PROFILE = None
+
+def start_profiling(report_path, memory=False):
+    # Профилирование включается только параметром profile=, без него проверки сводятся к сравнению с None.
+    # tracemalloc заметно замедляет программу, поэтому пики памяти по фазам собираются только с profile_memory=1.
+    global PROFILE
+    if memory:
+        tracemalloc.start()
+    PROFILE = {"script": os.path.basename(sys.argv[0]), "started": time.perf_counter(), "memory": memory, "phases": {}, "calls": {}, "stack": []}
+    atexit.register(write_profile, report_path)
+
+def is_enabled(value):
+    return value is not None and value.lower() in ("1", "true", "yes")
+
+def is_disabled(value):
+    return value is None or value.lower() in ("", "0", "false", "no")
+
+def profile_path(value, output_path):
+    # profile=1/true/yes пишет отчёт рядом с выходным файлом, profile=0/false/no отключает профилирование,
+    # любое другое значение — путь к отчёту
+    if is_disabled(value):
+        return None
+    if is_enabled(value):
+        return f"{os.path.splitext(output_path)[0]}.profile.json"
+    return value
+
+@contextmanager
+def profile_phase(name):
+    if PROFILE is None:
+        yield
+        return
+    if not PROFILE["memory"]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats = PROFILE["phases"].setdefault(name, {"calls": 0, "seconds": 0.0})
+            stats["calls"] += 1
+            stats["seconds"] += time.perf_counter() - start
+        return
+    stack = PROFILE["stack"]
+    if stack:
+        stack[-1]["peak"] = max(stack[-1]["peak"], tracemalloc.get_traced_memory()[1])
+    tracemalloc.reset_peak()
+    frame = {"peak": 0}
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stack.pop()
+        # Пик вложенной фазы переносится во внешнюю, так как reset_peak общий на процесс
+        peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+        if stack:
+            stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+        stats = PROFILE["phases"].setdefault(name, {"calls": 0, "seconds": 0.0, "peak_bytes": 0})
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["peak_bytes"] = max(stats["peak_bytes"], peak)
+
+def profile_call(name, seconds):
+    stats = PROFILE["calls"].setdefault(name, {"calls": 0, "seconds": 0.0})
+    stats["calls"] += 1
+    stats["seconds"] += seconds
+
+def profile_layer(index, seconds):
+    layers = PROFILE.setdefault("layers", [])
+    while len(layers) <= index:
+        layers.append({"layer": len(layers), "calls": 0, "seconds": 0.0})
+    layers[index]["calls"] += 1
+    layers[index]["seconds"] += seconds
+
+def write_profile(report_path):
+    report = {
+        "script": PROFILE["script"],
+        "total_seconds": time.perf_counter() - PROFILE["started"],
+        # Пиковый размер резидентной памяти процесса; в Linux ru_maxrss задаётся в килобайтах
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+    if PROFILE["memory"]:
+        report["peak_bytes"] = max((stats["peak_bytes"] for stats in PROFILE["phases"].values()), default=0)
+        tracemalloc.stop()
+    report["phases"] = PROFILE["phases"]
+    report["calls"] = PROFILE["calls"]
+    for key in ("layers", "epochs"):
+        if key in PROFILE:
+            report[key] = PROFILE[key]
+    with open(report_path, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,212 @@
+import struct
+
+import numpy as np
+
+def is_sparse(layer):
+    return isinstance(layer, dict)
+
+def layer_shape(layer):
+    return layer["shape"] if is_sparse(layer) else layer.shape
+
+def layer_dtype(layer):
+    return layer["data"].dtype if is_sparse(layer) else layer.dtype
+
+def make_sparse(shape, data, indices, indptr):
+    # CSR: значения и столбцы ненулевых весов построчно, indptr[i]:indptr[i + 1] — связи нейрона i
+    rows, cols = int(shape[0]), int(shape[1])
+    indices = np.asarray(indices, dtype=np.int64)
+    indptr = np.asarray(indptr, dtype=np.int64)
+    nonempty = np.flatnonzero(np.diff(indptr))
+    row_ids = np.repeat(np.arange(rows, dtype=np.int64), np.diff(indptr))
+    # Для произведения на транспонированную матрицу связи дополнительно упорядочены по столбцам
+    order = np.argsort(indices, kind="stable")
+    column_counts = np.bincount(indices, minlength=cols)
+    column_nonempty = np.flatnonzero(column_counts)
+    return {
+        "shape": (rows, cols),
+        "data": data,
+        "indices": indices,
+        "indptr": indptr,
+        "nonempty": nonempty,
+        "starts": indptr[nonempty],
+        "rows": row_ids,
+        "order": order,
+        "order_rows": row_ids[order],
+        "column_nonempty": column_nonempty,
+        "column_starts": (np.cumsum(column_counts) - column_counts)[column_nonempty],
+    }
+
+def sparse_from_entries(rows, cols, entries):
+    entries = sorted(entries)
+    for (row, col, _), following in zip(entries, entries[1:] + [None]):
+        if not (0 <= row < rows and 0 <= col < cols):
+            raise ValueError(f"связь ({row}, {col}) выходит за пределы матрицы {rows}x{cols}")
+        if following is not None and following[:2] == (row, col):
+            raise ValueError(f"связь ({row}, {col}) задана повторно")
+    row_ids = np.array([row for row, _, _ in entries], dtype=np.int64)
+    indptr = np.zeros(rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(row_ids, minlength=rows), out=indptr[1:])
+    data = np.array([value for _, _, value in entries], dtype=np.float64)
+    return make_sparse((rows, cols), data, [col for _, col, _ in entries], indptr)
+
+def sparse_from_dense(matrix):
+    rows, cols = np.nonzero(matrix)
+    indptr = np.zeros(matrix.shape[0] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=matrix.shape[0]), out=indptr[1:])
+    return make_sparse(matrix.shape, matrix[rows, cols], cols, indptr)
+
+def sparsify(layers, density):
+    # Плотный слой становится CSR, если доля ненулевых весов не больше density; списки строк сначала
+    # приводятся к матрице, а слои, оставшиеся плотными, возвращаются как были
+    result = []
+    for layer in layers:
+        if not is_sparse(layer):
+            dense = layer if isinstance(layer, np.ndarray) else np.array(layer, dtype=np.float64, ndmin=2)
+            if dense.size and np.count_nonzero(dense) <= density * dense.size:
+                layer = sparse_from_dense(dense)
+        result.append(layer)
+    return result
+
+def sparse_matmul(inputs, layer, dtype=None, out=None):
+    # inputs @ W.T: произведения по ненулевым связям суммируются отрезками строк CSR
+    products = np.multiply(inputs[:, layer["indices"]], layer["data"], dtype=dtype)
+    if out is None:
+        out = np.empty((inputs.shape[0], layer["shape"][0]), dtype=products.dtype)
+    out.fill(0)
+    if products.shape[1]:
+        out[:, layer["nonempty"]] = np.add.reduceat(products, layer["starts"], axis=1)
+    return out
+
+def sparse_entries(layer):
+    rows = np.repeat(np.arange(layer["shape"][0]), np.diff(layer["indptr"]))
+    return zip(rows.tolist(), layer["indices"].tolist(), layer["data"].tolist())
+
+def parse_sparse_line(line):
+    # Разреженный слой: "sparse <нейронов> <входов> [строка столбец вес] ..."
+    head, _, body = line.partition("[")
+    _, rows, cols = head.split()
+    entries = []
+    if body:
+        for entry in body.strip("[] ").split("] ["):
+            row, col, value = entry.split()
+            entries.append((int(row), int(col), float(value)))
+    return sparse_from_entries(int(rows), int(cols), entries)
+
+BINARY_MAGIC = b"NNWB"
+SPARSE_MAGIC = b"NNWS"
+BINARY_HEADER = struct.Struct("<4s8sI")
+BINARY_SHAPE = struct.Struct("<QQ")
+BINARY_ALIGN = 64
+SPARSE_SHAPE = struct.Struct("<QQQ")
+SPARSE_ALIGN = 8
+DENSE_LAYER = (1 << 64) - 1
+
+def is_binary_weights(file_path):
+    with open(file_path, "rb") as file:
+        return file.read(len(BINARY_MAGIC)) in (BINARY_MAGIC, SPARSE_MAGIC)
+
+def aligned(offset, alignment):
+    return -(-offset // alignment) * alignment
+
+def read_binary_weights(file_path, mode="c"):
+    # По умолчанию отображение копируется при записи: обучение может менять веса на месте, файл при этом не меняется.
+    # Любое повреждение заголовка или обрезанный файл сообщаются как ValueError, кэш считает это промахом.
+    with open(file_path, "rb") as file:
+        header = file.read(BINARY_HEADER.size)
+        if len(header) != BINARY_HEADER.size:
+            raise ValueError("файл весов обрезан")
+        magic, dtype, count = BINARY_HEADER.unpack(header)
+        if magic not in (BINARY_MAGIC, SPARSE_MAGIC):
+            raise ValueError("неизвестный формат файла весов")
+        shape = SPARSE_SHAPE if magic == SPARSE_MAGIC else BINARY_SHAPE
+        table = file.read(shape.size * count)
+        if len(table) != shape.size * count:
+            raise ValueError("файл весов обрезан")
+        shapes = list(shape.iter_unpack(table))
+    try:
+        dtype = np.dtype(dtype.rstrip(b"\0").decode("ascii"))
+    except TypeError as e:
+        raise ValueError(f"неизвестный тип данных в заголовке файла весов: {e}") from e
+    if dtype.kind != "f":
+        raise ValueError(f"неподдерживаемый тип данных в заголовке файла весов: {dtype}")
+    offset = aligned(BINARY_HEADER.size + shape.size * count, BINARY_ALIGN)
+    data = np.memmap(file_path, dtype=np.uint8, mode=mode)
+
+    def block(count, block_dtype, alignment=1):
+        nonlocal offset
+        offset = aligned(offset, alignment)
+        size = count * np.dtype(block_dtype).itemsize
+        if offset + size > len(data):
+            raise ValueError("файл весов обрезан")
+        view = data[offset:offset + size].view(block_dtype)
+        offset += size
+        return view
+
+    if magic == BINARY_MAGIC:
+        return [block(rows * cols, dtype).reshape(rows, cols) for rows, cols in shapes]
+
+    layers = []
+    for rows, cols, nnz in shapes:
+        if nnz == DENSE_LAYER:
+            layers.append(block(rows * cols, dtype, SPARSE_ALIGN).reshape(rows, cols))
+        else:
+            values = block(nnz, dtype, SPARSE_ALIGN)
+            indices = block(nnz, np.int64, SPARSE_ALIGN)
+            layers.append(make_sparse((rows, cols), values, indices, block(rows + 1, np.int64, SPARSE_ALIGN)))
+    return layers
+
+def write_sparse_binary(layers, output_path, dtype):
+    header = BINARY_HEADER.pack(SPARSE_MAGIC, dtype.str.encode("ascii"), len(layers))
+    header += b"".join(
+        SPARSE_SHAPE.pack(*layer["shape"], len(layer["data"])) if is_sparse(layer)
+        else SPARSE_SHAPE.pack(*layer.shape, DENSE_LAYER)
+        for layer in layers
+    )
+    with open(output_path, "wb") as file:
+        file.write(header.ljust(aligned(len(header), BINARY_ALIGN), b"\0"))
+        blocks = []
+        for layer in layers:
+            if is_sparse(layer):
+                blocks += [layer["data"], layer["indices"], layer["indptr"]]
+            else:
+                blocks.append(layer)
+        for values in blocks:
+            file.write(b"\0" * (aligned(file.tell(), SPARSE_ALIGN) - file.tell()))
+            values.tofile(file)
+
+def write_binary_weights(data, output_path, dtype=np.float64):
+    dtype = np.dtype(dtype)
+    layers = []
+    for i, layer_data in enumerate(data):
+        if is_sparse(layer_data):
+            layers.append(dict(layer_data, data=np.ascontiguousarray(layer_data["data"], dtype=dtype)))
+            continue
+        if len({len(neuron_values) for neuron_values in layer_data}) > 1:
+            raise ValueError(f"слой {i + 1} не является прямоугольной матрицей")
+        layers.append(np.ascontiguousarray(layer_data, dtype=dtype))
+    if any(is_sparse(layer) for layer in layers):
+        write_sparse_binary(layers, output_path, dtype)
+        return
+    header = BINARY_HEADER.pack(BINARY_MAGIC, dtype.str.encode("ascii"), len(layers))
+    header += b"".join(BINARY_SHAPE.pack(*layer.shape) for layer in layers)
+    with open(output_path, "wb") as file:
+        file.write(header.ljust(-(-len(header) // BINARY_ALIGN) * BINARY_ALIGN, b"\0"))
+        for layer in layers:
+            layer.tofile(file)
+
+def read_text_weights(file_path):
+    with open(file_path, 'r') as file:
+        lines = file.readlines()
+    processed_data = []
+    for line in lines:
+        line = line.strip()
+        if line.startswith("sparse"):
+            processed_data.append(parse_sparse_line(line))
+        elif line:
+            arrays = line.strip("[]").split("] [")
+            layer = []
+            for array in arrays:
+                values = [float(value) for value in array.split()]
+                layer.append(values)
+            processed_data.append(layer)
+    return processed_data
@@ -1,10 +1,16 @@
+import os
 import sys
-import re
 import xml.etree.ElementTree as ET
 
+# Общие модули лежат в каталоге Task/common рядом с каталогами заданий
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.arcs import collect_arcs, read_arcs, read_cached_arcs
+from common.cache import CACHE_SIZE
+from common.profiling import is_enabled, profile_path, profile_phase, start_profiling
+
 def parse_arguments():
     args = sys.argv[1:]
-    params = {"input1": "input.txt", "output1": "output.xml", "input2": None, "output2": None}
+    params = {"input1": "input.txt", "output1": "output.xml", "input2": None, "output2": None, "export": "tree", "profile": None, "profile_memory": None, "cache": None, "cache_size": 256}
     for arg in args:
         key, _, value = arg.partition("=")
         if key in params:
@@ -15,37 +21,38 @@ def write_error(exp):
     with open("error.txt", 'w', encoding="utf-8") as file:
         file.write(exp)
 
-def validate_and_parse_graph(file_content):
-    graph = {"vertices": set(), "arcs": []}
-    pattern = r"\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\)"
-    order_check = {}
-    matches = re.findall(pattern, file_content.replace("\n", "").strip())
-    if len(matches) == 0:
-        return f"Ошибка: неверные данные во входном файле"
-    unique_edges = set()
-    for match in matches:
-        a, b, n = map(int, match)
-        graph["vertices"].add(a)
-        graph["vertices"].add(b)
-        arc = (a, b, n)
-        edge = (a, b)
-        graph["arcs"].append(arc)
+def iter_xml_arcs(file_path):
+    context = ET.iterparse(file_path, events=("start", "end"))
+    _, root = next(context)
+    arc = {}
+    for event, elem in context:
+        if event != "end":
+            continue
+        if elem.tag in ("from", "to"):
+            arc[elem.tag] = int(elem.text.strip()[1:])
+        elif elem.tag == "order":
+            arc["order"] = int(elem.text)
+        elif elem.tag == "arc":
+            yield arc["from"], arc["to"], arc["order"]
+            arc = {}
+            root.clear()
+        elif elem.tag == "vertex":
+            root.clear()
 
-        if edge in unique_edges:
-            return f"Ошибка: повторяющаяся дуга между вершинами ({a}, {b})"
-        unique_edges.add(edge)
-        
-        if b not in order_check:
-            order_check[b] = set()
-        if n in order_check[b]:
-            return f"Ошибка: повторяющийся номер дуги {n} для вершины {b}"
-        order_check[b].add(n)
-    
-    for vertex, orders in order_check.items():
-        if sorted(orders) != list(range(1, len(orders) + 1)):
-            return f"Ошибка: у вершины {vertex} нарушена последовательность номеров дуг"
-    
-    return graph
+def read_xml(file_path):
+    return collect_arcs(iter_xml_arcs(file_path))
+
+def validate_and_parse_graph(file_path, cache_dir=None, cache_size=CACHE_SIZE):
+    reader, kind = (read_xml, "xml") if file_path.endswith(".xml") else (read_arcs, "arcs")
+    if cache_dir:
+        error, sources, targets, orders = read_cached_arcs(file_path, reader, kind, cache_dir, cache_size)
+    else:
+        error, sources, targets, orders = reader(file_path)
+    if error:
+        return error
+    vertices = set(sources)
+    vertices.update(targets)
+    return {"vertices": vertices, "sources": sources, "targets": targets, "orders": orders}
 
 def build_xml(graph):
     root = ET.Element("graph")
@@ -53,36 +60,57 @@ def build_xml(graph):
         vertex_elem = ET.SubElement(root, "vertex")
         vertex_elem.text = f"v{vertex}"
     
-    for arc in graph["arcs"]:
+    for a, b, n in zip(graph["sources"], graph["targets"], graph["orders"]):
         arc_elem = ET.SubElement(root, "arc")
         from_elem = ET.SubElement(arc_elem, "from")
-        from_elem.text = f"v{arc[0]}"
+        from_elem.text = f"v{a}"
         to_elem = ET.SubElement(arc_elem, "to")
-        to_elem.text = f"v{arc[1]}"
+        to_elem.text = f"v{b}"
         order_elem = ET.SubElement(arc_elem, "order")
-        order_elem.text = str(arc[2])
+        order_elem.text = str(n)
     
     return ET.ElementTree(root)
 
+def write_xml(graph, output_path, buffer_size=1 << 20):
+    with open(output_path, "w", encoding="utf-8", buffering=buffer_size) as file:
+        file.write("<?xml version='1.0' encoding='utf-8'?>\n<graph>")
+        for vertex in sorted(graph["vertices"]):
+            file.write(f"<vertex>v{vertex}</vertex>")
+        for a, b, n in zip(graph["sources"], graph["targets"], graph["orders"]):
+            file.write(f"<arc><from>v{a}</from><to>v{b}</to><order>{n}</order></arc>")
+        file.write("</graph>")
+
 def main():
     params = parse_arguments()
-    
+    report_path = profile_path(params["profile"], params["output1"])
+    if report_path:
+        start_profiling(report_path, is_enabled(params["profile_memory"]))
+
     try:
-        with open(params["input1"], "r", encoding="utf-8") as infile:
-            file_content = infile.read()
+        with profile_phase("parse"):
+            graph = validate_and_parse_graph(
+                params["input1"], params["cache"], int(float(params["cache_size"]) * (1 << 20))
+            )
     except FileNotFoundError:
         write_error((f"Ошибка: входной файл {params['input1']} не найден."))
         return
-    
-    graph = validate_and_parse_graph(file_content)
+    except (ET.ParseError, KeyError, ValueError, AttributeError):
+        write_error(f"Ошибка: неверные данные во входном файле")
+        return
     if isinstance(graph, str): 
         write_error(graph)
         return
     
-    tree = build_xml(graph)
     output_file = params["output1"]
     try:
-        tree.write(output_file, encoding="utf-8", xml_declaration=True)
+        if params["export"] == "stream":
+            with profile_phase("write_xml"):
+                write_xml(graph, output_file)
+        else:
+            with profile_phase("build_xml"):
+                tree = build_xml(graph)
+            with profile_phase("write_xml"):
+                tree.write(output_file, encoding="utf-8", xml_declaration=True)
         print(f"Граф успешно записан в файл {output_file}.")
     except Exception as e:
         print(f"Ошибка при записи в файл: {e}")
@@ -1,9 +1,20 @@
+import os
 import sys
-import re
+import time
+from bisect import bisect_left, insort
+
+# Общие модули лежат в каталоге Task/common рядом с каталогами заданий
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import profiling
+from common.arcs import read_arcs, read_cached_arcs
+from common.cache import CACHE_SIZE
+from common.graph import find_sinks, topological_order
+from common.incremental import add_arcs, current_sinks, graph_error, incremental_graph, propagate, read_follow_batches
+from common.profiling import is_enabled, profile_call, profile_path, profile_phase, start_profiling
 
 def parse_arguments():
     args = sys.argv[1:]
-    params = {"input1": "input1.txt", "output1": "output.txt", "input2": None, "output2": None}
+    params = {"input1": "input1.txt", "output1": "output.txt", "input2": None, "output2": None, "format": "flat", "profile": None, "profile_memory": None, "cache": None, "cache_size": 256, "follow": None}
     for arg in args:
         key, _, value = arg.partition("=")
         if key in params:
@@ -14,30 +25,18 @@ def write_error(exp):
     with open("error.txt", 'w', encoding="utf-8") as file:
         file.write(exp)
 
-def validate_and_build_graph(file_content):
-    pattern = r"\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\)"
+def validate_and_build_graph(file_path, cache_dir=None, cache_size=CACHE_SIZE):
+    if cache_dir:
+        error, sources, targets, orders = read_cached_arcs(file_path, read_arcs, "arcs", cache_dir, cache_size)
+    else:
+        error, sources, targets, orders = read_arcs(file_path)
+    if error:
+        return error, None, None, None
+
     graph = {}
     in_degrees = {}
     out_degrees = {}
-    order_check = {}
-    matches = re.findall(pattern, file_content.replace("\n", "").strip())
-    if len(matches) == 0:
-        return f"Ошибка: неверные данные во входном файле", None, None, None
-    unique_edges = set()
-    for match in matches:
-        a, b, n = map(int, match)
-        edge = (a, b)
-
-        if edge in unique_edges:
-            return f"Ошибка: повторяющаяся дуга между вершинами ({a}, {b})", None, None, None
-        unique_edges.add(edge)
-
-        if b not in order_check:
-            order_check[b] = set()
-        if n in order_check[b]:
-            return f"Ошибка: повторяющийся номер дуги {n} для вершины {b}", None, None, None
-        order_check[b].add(n)
-
+    for a, b, n in zip(sources, targets, orders):
         if b not in graph:
             graph[b] = []
         graph[b].append((a, n))
@@ -45,68 +44,183 @@ def validate_and_build_graph(file_content):
         in_degrees[b] = in_degrees.get(b, 0) + 1
         out_degrees[a] = out_degrees.get(a, 0) + 1
 
-    for vertex, orders in order_check.items():
-        if sorted(orders) != list(range(1, len(orders) + 1)):
-            return f"Ошибка: у вершины {vertex} нарушена последовательность номеров дуг", None, None, None
+    for children in graph.values():
+        children.sort(key=lambda x: x[1])
 
     return None, graph, in_degrees, out_degrees
 
-def has_cycle(graph):
-    visited = set()
-    stack = set()
-    
-    def dfs(vertex):
-        if vertex in stack:
-            return True
-        if vertex in visited:
-            return False
-
-        visited.add(vertex)
-        stack.add(vertex)
-        for neighbor, _ in graph.get(vertex, []):
-            if dfs(neighbor):
-                return True
-        stack.remove(vertex)
-        return False
-    for node in graph:
-        if dfs(node):
-            return True
-    return False
-
-def build_function_representation(graph, in_degrees, out_degrees):
-    sinks = [node for node in in_degrees if node not in out_degrees]
-
-    def build_expression(vertex):
-        children = sorted(graph.get(vertex, []), key=lambda x: x[1])
-        children_expr = ", ".join([f"{build_expression(child)}" for child, _ in children])
-        return f"{vertex}({children_expr})" if children else f"{vertex}"
-    return ", ".join(build_expression(sink) for sink in sinks)
+def write_function_representation(graph, sinks, output_path):
+    # Выражение выписывается обходом с явным стеком: в памяти только путь от стока, а не строки всех вершин
+    with open(output_path, "w", encoding="utf-8", buffering=1 << 20) as outfile:
+        stack = [iter(sinks)]
+        first = [True]
+        while stack:
+            vertex = next(stack[-1], None)
+            if vertex is None:
+                stack.pop()
+                first.pop()
+                if stack:
+                    outfile.write(")")
+                continue
+            if not first[-1]:
+                outfile.write(", ")
+            first[-1] = False
+            children = graph.get(vertex)
+            if children:
+                outfile.write(f"{vertex}(")
+                stack.append(child for child, _ in children)
+                first.append(True)
+            else:
+                outfile.write(f"{vertex}")
+
+def vertex_heights(graph, order):
+    # Высота — длина самого длинного пути до листа; аргументы всегда ниже вершины
+    heights = {}
+    for vertex in order:
+        children = graph.get(vertex)
+        heights[vertex] = 1 + max(heights[child] for child, _ in children) if children else 0
+    return heights
+
+def write_shared_representation(graph, sinks, order, out_degrees, output_path):
+    # Определения выписываются по (высоте, вершине): этот порядок follow поддерживает без обхода графа
+    heights = vertex_heights(graph, order)
+    expressions = {}
+    with open(output_path, "w", encoding="utf-8", buffering=1 << 20) as outfile:
+        for vertex in sorted(order, key=lambda vertex: (heights[vertex], vertex)):
+            children = graph.get(vertex, [])
+            if not children:
+                expressions[vertex] = f"{vertex}"
+                continue
+            children_expr = ", ".join(
+                expressions[child] if out_degrees[child] > 1 else expressions.pop(child)
+                for child, _ in children
+            )
+            expression = f"{vertex}({children_expr})"
+            if out_degrees.get(vertex, 0) > 1:
+                outfile.write(f"${vertex} = {expression}\n")
+                expression = f"${vertex}"
+            expressions[vertex] = expression
+        outfile.write(", ".join(expressions[sink] for sink in sinks))
+
+def write_representation(graph, sinks, order, out_degrees, output_path, representation_format):
+    if representation_format == "shared":
+        with profile_phase("representation"):
+            write_shared_representation(graph, sinks, order, out_degrees, output_path)
+    else:
+        with profile_phase("representation"):
+            write_function_representation(graph, sinks, output_path)
+
+def create_rendering(state, representation_format):
+    # Выражения вершин кэшируются между пакетами: после новых дуг перестраиваются только изменившиеся вершины
+    rendering = {
+        "state": state,
+        "shared": representation_format == "shared",
+        "expressions": {},
+        "heights": {},
+        "definitions": {},
+        "levels": {},
+    }
+    render(rendering, state["position"])
+    return rendering
+
+def render(rendering, dirty):
+    graph, out_degrees = rendering["state"]["graph"], rendering["state"]["out_degrees"]
+    expressions, heights = rendering["expressions"], rendering["heights"]
+    definitions, levels = rendering["definitions"], rendering["levels"]
+
+    def update(vertex):
+        children = graph.get(vertex, [])
+        if children:
+            expression = f"{vertex}({', '.join(expressions[child] for child, _ in children)})"
+            height = 1 + max(heights[child] for child, _ in children)
+        else:
+            expression = f"{vertex}"
+            height = 0
+        # Определения разложены по высотам и внутри высоты отсортированы, как их пишет полный проход
+        previous = heights.get(vertex)
+        if vertex in definitions:
+            level = levels[previous]
+            del level[bisect_left(level, vertex)]
+            if not level:
+                del levels[previous]
+        if rendering["shared"] and children and out_degrees.get(vertex, 0) > 1:
+            definitions[vertex] = f"${vertex} = {expression}\n"
+            insort(levels.setdefault(height, []), vertex)
+            expression = f"${vertex}"
+        else:
+            definitions.pop(vertex, None)
+        # Родителей нужно перестраивать, только если изменился текст, который они подставляют, или высота
+        changed = expressions.get(vertex) != expression or previous != height
+        expressions[vertex] = expression
+        heights[vertex] = height
+        return changed
+
+    return propagate(rendering["state"], dirty, update)
+
+def write_rendering(rendering, sinks, output_path):
+    definitions, expressions = rendering["definitions"], rendering["expressions"]
+    with open(output_path, "w", encoding="utf-8", buffering=1 << 20) as outfile:
+        for height in sorted(rendering["levels"]):
+            outfile.writelines(definitions[vertex] for vertex in rendering["levels"][height])
+        outfile.write(", ".join(expressions[sink] for sink in sinks))
+
+def follow_graph(state, source, params):
+    with profile_phase("representation"):
+        rendering = create_rendering(state, params["format"])
+    status_file = open(params["output2"], "w", encoding="utf-8") if params["output2"] else sys.stdout
+    try:
+        for arcs in read_follow_batches(source):
+            if profiling.PROFILE is not None:
+                start = time.perf_counter()
+            error = add_arcs(state, arcs)
+            if not error:
+                render(rendering, {vertex for a, b, _ in arcs for vertex in (a, b)})
+                error = graph_error(state)
+            if not error:
+                write_rendering(rendering, current_sinks(state), params["output1"])
+            if profiling.PROFILE is not None:
+                profile_call("follow_batch", time.perf_counter() - start)
+            status_file.write((error or f"Функция успешно сохранена в {params['output1']}.") + "\n")
+            status_file.flush()
+    finally:
+        if status_file is not sys.stdout:
+            status_file.close()
 
 def main():
     params = parse_arguments()
-    
+    report_path = profile_path(params["profile"], params["output1"])
+    if report_path:
+        start_profiling(report_path, is_enabled(params["profile_memory"]))
+
     try:
-        with open(params["input1"], "r", encoding="utf-8") as infile:
-            file_content = infile.read()
+        with profile_phase("parse"):
+            error, graph, in_degrees, out_degrees = validate_and_build_graph(
+                params["input1"], params["cache"], int(float(params["cache_size"]) * (1 << 20))
+            )
     except FileNotFoundError:
         write_error((f"Ошибка: входной файл {params['input1']} не найден."))
         return
-
-    error, graph, in_degrees, out_degrees = validate_and_build_graph(file_content)
     if error:
         write_error(error)
         return
 
-    if has_cycle(graph):
-        write_error("Ошибка: граф содержит циклы.")
+    sinks = find_sinks(in_degrees, out_degrees)
+    with profile_phase("topological_order"):
+        order, cycle = topological_order(graph, sinks)
+    if cycle:
+        write_error(f"Ошибка: граф содержит циклы. Цикл: {' -> '.join(map(str, cycle))}")
         return
 
-    function_representation = build_function_representation(graph, in_degrees, out_degrees)
-
-    with open(params["output1"], "w", encoding="utf-8") as outfile:
-        outfile.write(function_representation)
+    write_representation(graph, sinks, order, out_degrees, params["output1"], params["format"])
     
     print(f"Функция успешно сохранена в {params['output1']}.")
 
+    if params["follow"]:
+        state = incremental_graph(graph, in_degrees, out_degrees, order)
+        try:
+            follow_graph(state, params["follow"], params)
+        except FileNotFoundError as e:
+            write_error(f"Ошибка: входной файл {e.filename} не найден.")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,10 +1,23 @@
+import os
 import re
 import sys
+import time
+from array import array
 from math import exp
+import numpy as np
+
+# Общие модули лежат в каталоге Task/common рядом с каталогами заданий
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import profiling
+from common.arcs import read_arcs, read_cached_arcs
+from common.cache import CACHE_SIZE
+from common.graph import find_sinks, topological_order
+from common.incremental import add_arcs, current_sinks, graph_error, incremental_graph, propagate, read_follow_batches
+from common.profiling import is_enabled, profile_call, profile_path, profile_phase, start_profiling
 
 def parse_arguments():
     args = sys.argv[1:]
-    params = {"input1": "input1.txt", "output1": "output.txt", "input2": "operations.txt", "output2": None}
+    params = {"input1": "input1.txt", "output1": "output.txt", "input2": "operations.txt", "output2": None, "batch": None, "profile": None, "profile_memory": None, "cache": None, "cache_size": 256, "session": None, "follow": None}
     for arg in args:
         key, _, value = arg.partition("=")
         if key in params:
@@ -15,121 +28,272 @@ def write_error(message):
     with open("error.txt", 'w', encoding="utf-8") as file:
         file.write(message)
 
-def load_graph(filename):
-    pattern = r"\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\)"
+def load_graph(filename, cache_dir=None, cache_size=CACHE_SIZE):
+    if cache_dir:
+        error, sources, targets, orders = read_cached_arcs(filename, read_arcs, "arcs", cache_dir, cache_size)
+    else:
+        error, sources, targets, orders = read_arcs(filename)
+    if error:
+        return error, None, None, None
+
     graph = {}
     in_degrees = {}
     out_degrees = {}
-    unique_edges = set()
-    order_check = {}
-    with open(filename, "r", encoding="utf-8") as file:
-        content = file.read().replace("\n", "")
-        matches = re.findall(pattern, content)
-        if len(matches) == 0:
-            return f"Ошибка: неверные данные во входном файле", None, None, None
-        for match in matches:
-            a, b, n = map(int, match)
-            edge = (a, b)
-            if edge in unique_edges:
-                return f"Ошибка: повторяющаяся дуга между вершинами ({a}, {b})", None, None, None
-            unique_edges.add(edge)
-            if b not in order_check:
-                order_check[b] = set()
-            if n in order_check[b]:
-                return f"Ошибка: повторяющийся номер дуги {n} для вершины {b}", None, None, None
-            order_check[b].add(n)
-
-            if b not in graph:
-                graph[b] = []
-            graph[b].append((a, n))
-
-            in_degrees[b] = in_degrees.get(b, 0) + 1
-            out_degrees[a] = out_degrees.get(a, 0) + 1
-
-    for vertex, orders in order_check.items():
-        if sorted(orders) != list(range(1, len(orders) + 1)):
-            return f"Ошибка: у вершины {vertex} нарушена последовательность номеров дуг", None, None, None
+    for a, b, n in zip(sources, targets, orders):
+        if b not in graph:
+            graph[b] = []
+        graph[b].append((a, n))
+
+        in_degrees[b] = in_degrees.get(b, 0) + 1
+        out_degrees[a] = out_degrees.get(a, 0) + 1
+
+    for children in graph.values():
+        children.sort(key=lambda x: x[1])
 
     return None, graph, in_degrees, out_degrees
 
-def load_operations(filename):
+def parse_operations(content):
     operations = {}
-    with open(filename, "r", encoding="utf-8") as file:
-        content = file.read().strip()
-        matches = re.findall(r'(\d+)\s*:\s*([\d+*exp]+)', content)
-        for vertex, operation in matches:
-            operations[int(vertex)] = operation
+    matches = re.findall(r'(\d+)\s*:\s*([\d+*exp]+)', content)
+    for vertex, operation in matches:
+        operations[int(vertex)] = operation
     return operations
 
-def has_cycle(graph):
-    visited = set()
-    stack = set()
-
-    def dfs(vertex):
-        if vertex in stack:
-            return True
-        if vertex in visited:
-            return False
-        visited.add(vertex)
-        stack.add(vertex)
-        for neighbor, _ in graph.get(vertex, []):
-            if dfs(neighbor):
-                return True
-        stack.remove(vertex)
-        return False
-
-    for node in graph:
-        if dfs(node):
-            return True
-    return False
-
-def evaluate_expression(graph, operations, in_degrees, out_degrees, params):
-    sinks = [node for node in in_degrees if node not in out_degrees]
+def load_operations(filename):
+    with open(filename, "r", encoding="utf-8") as file:
+        return parse_operations(file.read().strip())
+
+def load_batch(filename):
+    with open(filename, "r", encoding="utf-8") as file:
+        header = [int(vertex) for vertex in file.readline().split()]
+        constants = np.loadtxt(file, ndmin=2)
+    if not header or constants.shape[0] == 0 or constants.shape[1] != len(header):
+        raise ValueError(f"матрица констант в {filename} не совпадает с заголовком вершин")
+    return header, constants
+
+def compile_graph(graph, order):
+    index = {vertex: i for i, vertex in enumerate(order)}
+    children = [[index[child] for child, _ in graph.get(vertex, [])] for vertex in order]
+    return index, children
+
+def evaluate_vertex(vertex, args, operation, values):
+    # Единая диспетчеризация операций: values[j] — число при полном проходе и в сессии или строка сценариев в пакете
+    if operation in ('+', '*', "exp") and not args:
+        return 0.0, ("error", f"Ошибка: операция '{operation}' для вершины {vertex} требует аргументов, но дочерние вершины отсутствуют.")
+
+    if operation is None:
+        return 0.0, ("error", f"Операция для вершины {vertex} не найдена.")
+
+    if operation == "+":
+        value = values[args[0]]
+        for j in args[1:]:
+            value = value + values[j]
+        return value, None
+    if operation == "*":
+        value = values[args[0]]
+        for j in args[1:]:
+            value = value * values[j]
+        return value, None
+    if operation == "exp":
+        argument = values[args[0]]
+        if isinstance(argument, np.ndarray):
+            # В пакете переполнение отмечается маской сценариев, а не останавливает вычисление
+            value = np.exp(argument)
+            overflow = np.isinf(value) & np.isfinite(argument)
+            return value, ("overflow", overflow) if overflow.any() else None
+        try:
+            return exp(argument), None
+        except OverflowError:
+            return float("inf"), ("overflow", True)
+    try:
+        return float(operation), None
+    except ValueError:
+        return 0.0, ("error", f"Неподдерживаемая операция или константа для вершины {vertex}: {operation}")
+
+def evaluate_graph(order, children, operations):
+    values = array("d", bytes(8 * len(order)))
+    for i, vertex in enumerate(order):
+        value, failure = evaluate_vertex(vertex, children[i], operations.get(vertex), values)
+        if failure:
+            return failure
+        values[i] = value
+    return "ok", values
+
+def evaluate_expression(graph, operations, sinks, order):
     if not sinks:
         return "Ошибка: граф не имеет стоковой вершины.", None
 
-    def evaluate(vertex):
-        children = sorted(graph.get(vertex, []), key=lambda x: x[1])
-        children_values  = [evaluate(child) for child, _ in children]
-        operation = operations.get(vertex)
-        
-        if operation in ('+', '*', "exp") and not children_values :
-            write_error(f"Ошибка: операция '{operation}' для вершины {vertex} требует аргументов, но дочерние вершины отсутствуют.")
-            sys.exit()
-
-        if operation is None:
-            write_error(f"Операция для вершины {vertex} не найдена.")
-            sys.exit()
-
-        if operation == "+":
-            return sum(children_values )
-        elif operation == "*":
-            result = 1
-            for val in children_values :
-                result *= val
-            return result
-        elif operation == "exp":
-            try:
-                return exp(children_values [0]) if children_values else 1
-            except OverflowError:
-                with open(params["output1"], "w", encoding="utf-8") as outfile:
-                    outfile.write("Inf")
-                sys.exit()
-        else:
-            try:
-                return float(operation)
-            except ValueError:
-                write_error(f"Неподдерживаемая операция или константа для вершины {vertex}: {operation}")
-                sys.exit()
-    evaluated_sinks = [str(evaluate(sink)) for sink in sinks]
+    with profile_phase("compile_graph"):
+        index, children = compile_graph(graph, order)
+    status, payload = evaluate_graph(order, children, operations)
+    if status == "error":
+        return payload, None
+    if status == "overflow":
+        return None, "Inf"
+    evaluated_sinks = [str(payload[index[sink]]) for sink in sinks]
     return None, ", ".join(evaluated_sinks)
 
+def evaluate_batch(order, children, operations, index, header, constants):
+    batch_size = constants.shape[0]
+    columns = {}
+    for k, vertex in enumerate(header):
+        if vertex not in index or children[index[vertex]]:
+            return "error", f"Ошибка: вершина {vertex} из пакета констант не является листом графа."
+        columns[index[vertex]] = constants[:, k]
+
+    values = np.empty((len(order), batch_size))
+    overflow = np.zeros(batch_size, dtype=bool)
+    with np.errstate(over="ignore", invalid="ignore"):
+        for i, vertex in enumerate(order):
+            if i in columns:
+                values[i] = columns[i]
+                continue
+            value, failure = evaluate_vertex(vertex, children[i], operations.get(vertex), values)
+            if failure and failure[0] == "error":
+                return failure
+            if failure:
+                overflow |= failure[1]
+            values[i] = value
+    return "ok", (values, overflow)
+
+def evaluate_batch_expression(graph, operations, sinks, order, header, constants):
+    if not sinks:
+        return "Ошибка: граф не имеет стоковой вершины.", None
+
+    with profile_phase("compile_graph"):
+        index, children = compile_graph(graph, order)
+    status, payload = evaluate_batch(order, children, operations, index, header, constants)
+    if status == "error":
+        return payload, None
+    values, overflow = payload
+    sink_values = values[[index[sink] for sink in sinks]].T
+    lines = []
+    for row, overflowed in zip(sink_values.tolist(), overflow.tolist()):
+        lines.append("Inf" if overflowed else ", ".join(map(str, row)))
+    return None, "\n".join(lines)
+
+def create_session(state, operations, sinks):
+    # Сессия хранит значения по вершинам и пересчитывает их поверх инкрементального графа
+    session = {
+        "state": state,
+        "operations": dict(operations),
+        "sinks": list(sinks),
+        "values": {},
+        "failures": {},
+        "recomputed": 0,
+    }
+    recompute(session, state["position"])
+    return session
+
+def recompute(session, dirty):
+    graph = session["state"]["graph"]
+    operations, values, failures = session["operations"], session["values"], session["failures"]
+
+    def update(vertex):
+        args = [child for child, _ in graph.get(vertex, ())]
+        value, failure = evaluate_vertex(vertex, args, operations.get(vertex), values)
+        changed = failure != failures.get(vertex) or value != values.get(vertex)
+        values[vertex] = value
+        if failure is None:
+            failures.pop(vertex, None)
+        else:
+            failures[vertex] = failure
+        return changed
+
+    count = propagate(session["state"], dirty, update)
+    session["recomputed"] += count
+    return count
+
+def apply_delta(session, delta):
+    position, operations = session["state"]["position"], session["operations"]
+    dirty = []
+    for vertex, operation in delta.items():
+        if operations.get(vertex) == operation:
+            continue
+        operations[vertex] = operation
+        if vertex in position:
+            dirty.append(vertex)
+    return recompute(session, dirty)
+
+def session_result(session):
+    if not session["sinks"]:
+        return "Ошибка: граф не имеет стоковой вершины.", None
+    failures = session["failures"]
+    if failures:
+        # Полный проход останавливается на первой ошибке своего порядка обхода от стоков. Порядок сессии
+        # (position) с ним не совпадает, поэтому при нескольких ошибках порядок полного прохода строится заново
+        vertex = next(iter(failures))
+        if len(failures) > 1:
+            order, _ = topological_order(session["state"]["graph"], session["sinks"])
+            vertex = next(vertex for vertex in order if vertex in failures)
+        kind, payload = failures[vertex]
+        if kind == "error":
+            return payload, None
+        return None, "Inf"
+    values = session["values"]
+    return None, ", ".join(str(values[sink]) for sink in session["sinks"])
+
+def run_session(session, source, output_path=None):
+    input_file = sys.stdin if source == "-" else open(source, "r", encoding="utf-8")
+    output_file = open(output_path, "w", encoding="utf-8") if output_path else sys.stdout
+    try:
+        for line in input_file:
+            delta = parse_operations(line.strip())
+            if not delta:
+                continue
+            if profiling.PROFILE is not None:
+                start = time.perf_counter()
+            apply_delta(session, delta)
+            error, result = session_result(session)
+            if profiling.PROFILE is not None:
+                profile_call("apply_delta", time.perf_counter() - start)
+            output_file.write((error or result) + "\n")
+            output_file.flush()
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+def follow_graph(session, source, output_path, status_path=None):
+    state = session["state"]
+    status_file = open(status_path, "w", encoding="utf-8") if status_path else sys.stdout
+    try:
+        for arcs in read_follow_batches(source):
+            if profiling.PROFILE is not None:
+                start = time.perf_counter()
+            error = add_arcs(state, arcs)
+            if not error:
+                # Пересчитываются только концы новых дуг и те их потребители, чьи значения изменились
+                recompute(session, {vertex for a, b, _ in arcs for vertex in (a, b)})
+                session["sinks"] = current_sinks(state)
+                error = graph_error(state)
+            if not error:
+                error, result = session_result(session)
+            if not error:
+                with open(output_path, "w", encoding="utf-8") as outfile:
+                    outfile.write(result)
+            if profiling.PROFILE is not None:
+                profile_call("follow_batch", time.perf_counter() - start)
+            status_file.write((error or result) + "\n")
+            status_file.flush()
+    finally:
+        if status_file is not sys.stdout:
+            status_file.close()
+
 def main():
     params = parse_arguments()
+    report_path = profile_path(params["profile"], params["output1"])
+    if report_path:
+        start_profiling(report_path, is_enabled(params["profile_memory"]))
 
     try:
-        error, graph, in_degrees, out_degrees = load_graph(params["input1"])
-        operations = load_operations(params["input2"])
+        with profile_phase("parse"):
+            error, graph, in_degrees, out_degrees = load_graph(
+                params["input1"], params["cache"], int(float(params["cache_size"]) * (1 << 20))
+            )
+        with profile_phase("load_operations"):
+            operations = load_operations(params["input2"])
         if error:
             write_error(error)
             return
@@ -140,24 +304,57 @@ def main():
         write_error(f"Ошибка в формате файла: {str(e)}")
         return
 
-    if has_cycle(graph):
-        write_error("Ошибка: граф содержит циклы.")
+    sinks = find_sinks(in_degrees, out_degrees)
+    with profile_phase("topological_order"):
+        order, cycle = topological_order(graph, sinks)
+    if cycle:
+        write_error(f"Ошибка: граф содержит циклы. Цикл: {' -> '.join(map(str, cycle))}")
         return
 
+    session = None
     try:
-        error, result = evaluate_expression(graph, operations, in_degrees, out_degrees, params)
+        if params["batch"]:
+            with profile_phase("load_batch"):
+                header, constants = load_batch(params["batch"])
+            with profile_phase("evaluate"):
+                error, result = evaluate_batch_expression(graph, operations, sinks, order, header, constants)
+        elif params["session"] or params["follow"]:
+            with profile_phase("evaluate"):
+                session = create_session(incremental_graph(graph, in_degrees, out_degrees, order), operations, sinks)
+                error, result = session_result(session)
+        else:
+            with profile_phase("evaluate"):
+                error, result = evaluate_expression(graph, operations, sinks, order)
+    except FileNotFoundError as e:
+        write_error(f"Ошибка: файл не найден: {str(e)}")
+        return
     except ValueError as e:
         write_error(f"Ошибка при вычислении выражения: {str(e)}")
         return
 
     if error:
         write_error(error)
-        return
+        # Ошибку исходного вычисления могут исправить следующие изменения операций или дуг, поэтому сессия продолжается
+        if session is None:
+            return
+    else:
+        with open(params["output1"], "w", encoding="utf-8") as outfile:
+            outfile.write(result)
+
+        print(f"Результат успешно сохранён в {params['output1']}.")
 
-    with open(params["output1"], "w", encoding="utf-8") as outfile:
-        outfile.write(result)
-    
-    print(f"Результат успешно сохранён в {params['output1']}.")
+    if params["follow"]:
+        if session is None:
+            session = create_session(incremental_graph(graph, in_degrees, out_degrees, order), operations, sinks)
+        try:
+            follow_graph(session, params["follow"], params["output1"], params["output2"])
+        except FileNotFoundError as e:
+            write_error(f"Ошибка: файл не найден: {str(e)}")
+    elif session is not None:
+        try:
+            run_session(session, params["session"], params["output2"])
+        except FileNotFoundError as e:
+            write_error(f"Ошибка: файл не найден: {str(e)}")
 
 if __name__ == "__main__":
     main()
@@ -1,11 +1,37 @@
+import asyncio
+import json
+import os
+import signal
+import stat
 import sys
+import time
 import xml.etree.ElementTree as ET
 import numpy as np
-import math
+
+# Общие модули лежат в каталоге Task/common рядом с каталогами заданий
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import profiling
+from common.activations import resolve_activations, sigmoid
+from common.cache import CACHE_SIZE, file_digest, store_cache_entry, touch_cache_entry
+from common.precision import DTYPES, compute_dtype, write_precision_report
+from common.profiling import is_enabled, profile_layer, profile_path, profile_phase, start_profiling
+from common.weights import (
+    is_binary_weights,
+    is_sparse,
+    layer_dtype,
+    layer_shape,
+    read_binary_weights,
+    read_text_weights,
+    sparse_entries,
+    sparse_from_entries,
+    sparse_matmul,
+    sparsify,
+    write_binary_weights,
+)
 
 def parse_arguments():
     args = sys.argv[1:]
-    params = {"input1": "input1.txt", "output1": "output1.xml", "input2": "input2.txt", "output2": "output2.txt"}
+    params = {"input1": "input1.txt", "output1": "output1.xml", "input2": "input2.txt", "output2": "output2.txt", "format": "xml", "profile": None, "profile_memory": None, "serve": None, "max_batch": 64, "max_wait": 2, "dtype": "float64", "activation": "sigmoid", "kernel": "exact", "cache": None, "cache_size": 256, "sparse": None}
     for arg in args:
         key, _, value = arg.partition("=")
         if key in params:
@@ -16,21 +42,69 @@ def write_error(message):
     with open("error.txt", 'w', encoding="utf-8") as file:
         file.write(message)
 
-def read_matrix(file_path):
+def read_xml_weights(file_path):
+    processed_data = []
+    layer = []
+    for _, elem in ET.iterparse(file_path):
+        if elem.tag == "neuron":
+            layer.append([float(value) for value in elem.text.strip("[]").split()])
+            elem.clear()
+        elif elem.tag == "weight":
+            layer.append((int(elem.get("row")), int(elem.get("col")), float(elem.text)))
+            elem.clear()
+        elif elem.tag == "layer":
+            if "rows" in elem.attrib:
+                layer = sparse_from_entries(int(elem.get("rows")), int(elem.get("cols")), layer)
+            processed_data.append(layer)
+            layer = []
+            elem.clear()
+    return processed_data
+
+def write_text_weights(data, output_path):
+    with open(output_path, "w", encoding="utf-8") as file:
+        for layer_data in data:
+            if is_sparse(layer_data):
+                rows, cols = layer_data["shape"]
+                entries = "".join(f" [{row} {col} {value}]" for row, col, value in sparse_entries(layer_data))
+                file.write(f"sparse {rows} {cols}{entries}\n")
+                continue
+            if isinstance(layer_data, np.ndarray):
+                layer_data = layer_data.tolist()
+            file.write(" ".join("[" + " ".join(map(str, neuron_values)) + "]" for neuron_values in layer_data))
+            file.write("\n")
+
+def parse_weights(file_path):
+    if file_path.endswith(".xml"):
+        return read_xml_weights(file_path)
+    return read_text_weights(file_path)
+
+def dense_layers(layers):
+    # При промахе кэша слои приводятся к тому же виду, что и при попадании: плотные становятся массивами float64,
+    # а непрямоугольные остаются списками, чтобы build_layers сообщил о несоответствии размерностей
+    return [
+        layer if is_sparse(layer) or len({len(row) for row in layer}) > 1 else np.asarray(layer, dtype=np.float64)
+        for layer in layers
+    ]
+
+def read_cached_weights(file_path, cache_dir, cache_size):
+    kind = "xml-weights" if file_path.endswith(".xml") else "text-weights"
+    path = os.path.join(cache_dir, f"{file_digest(file_path, kind)}.nnw")
+    if touch_cache_entry(path):
+        try:
+            return read_binary_weights(path)
+        except (OSError, ValueError):
+            pass
+    layers = parse_weights(file_path)
+    store_cache_entry(cache_dir, path, lambda temporary: write_binary_weights(layers, temporary), cache_size)
+    return dense_layers(layers)
+
+def read_matrix(file_path, cache_dir=None, cache_size=CACHE_SIZE):
     try:
-        with open(file_path, 'r') as file:
-            lines = file.readlines()
-        processed_data = []
-        for line in lines:
-            line = line.strip()
-            if line:
-                arrays = line.strip("[]").split("] [")
-                int_arrays = []
-                for array in arrays:
-                    int_values = [float(value) for value in array.split()]
-                    int_arrays.append(int_values)
-                processed_data.append(int_arrays)
-        return processed_data
+        if is_binary_weights(file_path):
+            return read_binary_weights(file_path)
+        if cache_dir:
+            return read_cached_weights(file_path, cache_dir, cache_size)
+        return parse_weights(file_path)
     except FileNotFoundError:
         write_error(f"Ошибка: Файл '{file_path}' не найден.")
         sys.exit()
@@ -41,12 +115,11 @@ def read_matrix(file_path):
         write_error(f"Ошибка при чтении файла: {e}")
         sys.exit()
 
-def read_vector(file_path):
+def read_vectors(file_path):
     try:
         with open(file_path, 'r') as file:
-            line = file.readline().strip()
-            numbers = [float(num) for num in line.split()]
-        return numbers
+            vectors = [[float(num) for num in line.split()] for line in file if line.strip()]
+        return vectors
     except FileNotFoundError:
         write_error(f"Ошибка: Файл '{file_path}' не найден.")
         sys.exit()
@@ -62,6 +135,16 @@ def serialize_to_xml(data, output_path):
         root = ET.Element("NeuralNetwork")
         for layer_data in data:
             layer = ET.SubElement(root, "layer")
+            if is_sparse(layer_data):
+                # Нулевые веса не записываются: у слоя есть размеры, у каждой связи — координаты
+                layer.set("rows", str(layer_data["shape"][0]))
+                layer.set("cols", str(layer_data["shape"][1]))
+                for row, col, value in sparse_entries(layer_data):
+                    weight = ET.SubElement(layer, "weight", row=str(row), col=str(col))
+                    weight.text = str(value)
+                continue
+            if isinstance(layer_data, np.ndarray):
+                layer_data = layer_data.tolist()
             for neuron_values in layer_data:
                 neuron = ET.SubElement(layer, "neuron")
                 neuron.text = str(neuron_values).replace(",", "")
@@ -76,48 +159,364 @@ def serialize_to_xml(data, output_path):
         write_error(f"Ошибка при записи XML: {e}")
         sys.exit()
 
-def sigmoid(x):
-    return 1 / (1 + math.exp(-x))
+EXPORT_FORMATS = ("xml", "text", "binary")
+
+def export_network(data, output_path, dtype=np.float64, export_format="xml"):
+    # Формат выбирается параметром format=, а не расширением output1: по умолчанию, как и раньше, пишется XML
+    if not output_path:
+        return
+    if export_format == "binary":
+        try:
+            write_binary_weights(data, output_path, dtype)
+            print(f"Данные успешно записаны в {output_path}.")
+        except Exception as e:
+            write_error(f"Ошибка при записи бинарного файла: {e}")
+            sys.exit()
+    elif export_format == "text":
+        try:
+            write_text_weights(data, output_path)
+            print(f"Данные успешно записаны в {output_path}.")
+        except Exception as e:
+            write_error(f"Ошибка при записи файла: {e}")
+            sys.exit()
+    else:
+        serialize_to_xml(data, output_path)
 
-def calculate(matrix, vector):
-    output_by_layer = []
-    
+def dimension_error(expected=None, received=None):
+    message = f"Ошибка: Несоответствие размерностей. "
+    if expected is not None:
+        message += f"Ожидалось: {expected}, получили: {received}"
+    write_error(message)
+    sys.exit()
+
+def build_layers(matrix, vectors, dtype=np.float64):
+    try:
+        inputs = np.array(vectors, dtype=dtype, ndmin=2)
+    except ValueError:
+        dimension_error()
+    input_size = inputs.shape[1] if vectors else 0
+
+    layers = []
     for layer_weights in matrix:
-        current_layer_output = []
-
-        for neuron_weights in layer_weights:
-            if len(neuron_weights) == len(vector): 
-                weighted_sum = sum(weight * value for weight, 
-                                   value in zip(neuron_weights, vector)
-                                   )
-                neuron_output = sigmoid(weighted_sum)
-                current_layer_output.append(neuron_output)
+        if is_sparse(layer_weights):
+            weights = dict(layer_weights, data=layer_weights["data"].astype(dtype, copy=False))
+            if weights["shape"][1] != input_size:
+                dimension_error(weights["shape"][1], input_size)
+            layers.append(weights)
+            input_size = weights["shape"][0]
+            continue
+        if isinstance(layer_weights, np.ndarray):
+            weights = layer_weights.astype(dtype, copy=False)
+        else:
+            try:
+                weights = np.array(layer_weights, dtype=dtype, ndmin=2)
+            except ValueError:
+                dimension_error()
+        if weights.shape[1] != input_size:
+            dimension_error(weights.shape[1], input_size)
+        layers.append(weights)
+        input_size = weights.shape[0]
+    return inputs, layers
+
+def calculate(layers, inputs, kernels=None):
+    outputs = inputs
+    if not layers:
+        return np.empty((outputs.shape[0], 0))
+
+    for i, weights in enumerate(layers):
+        if profiling.PROFILE is not None:
+            start = time.perf_counter()
+        activation = kernels[i][0] if kernels else sigmoid
+        if is_sparse(weights):
+            outputs = activation(sparse_matmul(outputs, weights, compute_dtype(weights["data"].dtype)))
+        else:
+            outputs = activation(np.matmul(outputs, weights.T, dtype=compute_dtype(weights.dtype)))
+        if profiling.PROFILE is not None:
+            profile_layer(i, time.perf_counter() - start)
+
+    return outputs
+
+def precision_report(dtype, kernel, outputs, reference):
+    errors = np.abs(outputs.astype(np.float64) - reference)
+    relative = errors / np.maximum(np.abs(reference), np.finfo(np.float64).tiny)
+    return {
+        "dtype": dtype,
+        "kernel": kernel,
+        "compute_dtype": str(compute_dtype(dtype)),
+        "samples": len(reference),
+        "max_abs_error": float(errors.max()) if errors.size else 0.0,
+        "mean_abs_error": float(errors.mean()) if errors.size else 0.0,
+        "max_rel_error": float(relative.max()) if relative.size else 0.0,
+    }
+
+def load_server_network(file_path, dtype=np.float64, cache_dir=None, cache_size=CACHE_SIZE, density=None):
+    matrix = read_matrix(file_path, cache_dir, cache_size)
+    if density is not None:
+        matrix = sparsify(matrix, density)
+    if len(matrix) == 0 or (not is_sparse(matrix[0]) and len(matrix[0]) == 0):
+        dimension_error()
+    input_size = matrix[0]["shape"][1] if is_sparse(matrix[0]) else len(matrix[0][0])
+    _, layers = build_layers(matrix, [[0.0] * input_size], dtype)
+    return layers
+
+def parse_address(address):
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    if not port.isdigit():
+        raise ValueError(f"адрес '{address}' должен иметь вид [хост:]порт или unix:путь")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+def remove_socket(location):
+    # Удаляется только сокет, оставшийся от прошлого запуска; любой другой файл по этому пути не трогаем
+    try:
+        mode = os.stat(location).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise ValueError(f"путь '{location}' занят файлом, который не является сокетом")
+    os.unlink(location)
+
+def server_stats(state):
+    stats = state["stats"]
+    elapsed = time.perf_counter() - stats["started"]
+    served = stats["completed"]
+    return {
+        "requests": stats["requests"],
+        "errors": stats["errors"],
+        "batches": stats["batches"],
+        "average_batch": served / stats["batches"] if stats["batches"] else 0.0,
+        "requests_per_second": served / elapsed if elapsed > 0 else 0.0,
+        "average_latency_ms": 1000 * stats["latency"] / served if served else 0.0,
+        "max_latency_ms": 1000 * stats["max_latency"],
+    }
+
+# Запас на одно число запроса: самая длинная запись float64 с разделителем короче 32 символов
+REQUEST_CHARACTERS = 32
+
+def request_limit(input_size):
+    return max(1 << 16, input_size * REQUEST_CHARACTERS + (1 << 12))
+
+def reject_request(state, error):
+    future = asyncio.get_running_loop().create_future()
+    state["stats"]["requests"] += 1
+    state["stats"]["errors"] += 1
+    future.set_result(error)
+    return future
+
+def submit_request(state, line):
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    state["stats"]["requests"] += 1
+    try:
+        vector = [float(num) for num in line.split()]
+    except ValueError as e:
+        vector, error = None, f"Ошибка: Не удалось преобразовать данные в числа. {e}"
+    else:
+        error = None
+        if len(vector) != state["input_size"]:
+            error = f"Ошибка: Несоответствие размерностей. Ожидалось: {state['input_size']}, получили: {len(vector)}"
+    if error:
+        state["stats"]["errors"] += 1
+        future.set_result(error)
+    else:
+        state["queue"].put_nowait((vector, future, time.perf_counter()))
+    return future
+
+async def batch_worker(state):
+    loop = asyncio.get_running_loop()
+    queue = state["queue"]
+    stats = state["stats"]
+    while True:
+        batch = [await queue.get()]
+        # Запросы, пришедшие за max_wait после первого, обрабатываются одним прямым проходом
+        deadline = loop.time() + state["max_wait"]
+        while len(batch) < state["max_batch"]:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        try:
+            inputs = np.array([vector for vector, _, _ in batch], dtype=layer_dtype(state["layers"][0]), ndmin=2)
+            outputs = await loop.run_in_executor(None, calculate, state["layers"], inputs, state["kernels"])
+        except Exception as e:
+            # Сбой прямого прохода получают только запросы этого пакета, обработчик продолжает работу
+            stats["errors"] += len(batch)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_result(f"Ошибка: {e}")
+            continue
+        finished = time.perf_counter()
+        stats["batches"] += 1
+        for (_, future, received), row in zip(batch, outputs.tolist()):
+            latency = finished - received
+            stats["latency"] += latency
+            stats["max_latency"] = max(stats["max_latency"], latency)
+            stats["completed"] += 1
+            if not future.done():
+                future.set_result(", ".join(map(str, row)))
+
+async def skip_line(reader, consumed):
+    # Слишком длинная строка остаётся в буфере: она отбрасывается кусками вместе с переводом строки,
+    # чтобы её остаток не был принят за следующий запрос
+    while True:
+        await reader.read(consumed)
+        try:
+            await reader.readuntil(b"\n")
+            return
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+        except asyncio.IncompleteReadError:
+            return
+
+async def handle_client(reader, writer, state):
+    responses = asyncio.Queue()
+
+    async def respond():
+        while True:
+            future = await responses.get()
+            if future is None:
+                break
+            if future == "stats":
+                # Счётчики снимаются после ответа на все предыдущие запросы соединения
+                response = json.dumps(server_stats(state), ensure_ascii=False)
             else:
-                write_error(
-                    f"Ошибка: Несоответствие размерностей. "
-                )
-                sys.exit()
+                response = await future
+            writer.write((response + "\n").encode("utf-8"))
+            await writer.drain()
+
+    responder = asyncio.create_task(respond())
+    try:
+        while True:
+            try:
+                line = await reader.readuntil(b"\n")
+            except asyncio.IncompleteReadError as e:
+                line = e.partial
+                if not line:
+                    break
+            except asyncio.LimitOverrunError as e:
+                await skip_line(reader, e.consumed)
+                responses.put_nowait(reject_request(
+                    state, f"Ошибка: Несоответствие размерностей. Запрос длиннее {state['line_limit']} байт, "
+                           f"ожидалось {state['input_size']} чисел"
+                ))
+                continue
+            line = line.decode("utf-8").strip()
+            if line == "stats":
+                responses.put_nowait(line)
+            elif line:
+                responses.put_nowait(submit_request(state, line))
+    finally:
+        responses.put_nowait(None)
+        try:
+            await responder
+        except ConnectionError:
+            pass
+        writer.close()
+
+async def serve_network(layers, kernels, address, max_batch, max_wait):
+    kind, location = parse_address(address)
+    state = {
+        "layers": layers,
+        "kernels": kernels,
+        "input_size": layer_shape(layers[0])[1],
+        "line_limit": request_limit(layer_shape(layers[0])[1]),
+        "queue": asyncio.Queue(),
+        "max_batch": max_batch,
+        "max_wait": max_wait,
+        "stats": {"requests": 0, "errors": 0, "completed": 0, "batches": 0, "latency": 0.0, "max_latency": 0.0,
+                  "started": time.perf_counter()},
+    }
+    worker = asyncio.create_task(batch_worker(state))
 
-        output_by_layer.append(current_layer_output)
-        vector = current_layer_output
+    def handler(reader, writer):
+        return handle_client(reader, writer, state)
 
-    return output_by_layer[-1] if output_by_layer else [] 
+    if kind == "unix":
+        remove_socket(location)
+        server = await asyncio.start_unix_server(handler, path=location, limit=state["line_limit"])
+    else:
+        server = await asyncio.start_server(handler, *location, limit=state["line_limit"])
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    print(f"Сервер запущен: {address}")
+    async with server:
+        await stop.wait()
+    worker.cancel()
+    if kind == "unix":
+        remove_socket(location)
+    print(f"Сервер остановлен. Статистика: {json.dumps(server_stats(state), ensure_ascii=False)}")
 
 
 def main():
     params = parse_arguments()
+    report_path = profile_path(params["profile"], params["output2"])
+    if report_path:
+        start_profiling(report_path, is_enabled(params["profile_memory"]))
+
+    if params["dtype"] not in DTYPES:
+        write_error(f"Ошибка: неизвестный тип данных '{params['dtype']}'. Допустимые значения: {', '.join(DTYPES)}")
+        return
+    if params["format"] not in EXPORT_FORMATS:
+        write_error(f"Ошибка: неизвестный формат '{params['format']}'. Допустимые значения: {', '.join(EXPORT_FORMATS)}")
+        return
+    dtype = np.dtype(params["dtype"])
+    cache_size = int(float(params["cache_size"]) * (1 << 20))
+    density = float(params["sparse"]) if params["sparse"] else None
+
+    if params["serve"]:
+        layers = load_server_network(params["input1"], dtype, params["cache"], cache_size, density)
+        try:
+            kernels = resolve_activations(params["activation"], params["kernel"], len(layers))
+            asyncio.run(serve_network(
+                layers, kernels, params["serve"], int(params["max_batch"]), float(params["max_wait"]) / 1000
+            ))
+        except Exception as e:
+            write_error(f"Ошибка сервера: {e}")
+        return
 
     try:
-        layers = read_matrix(params["input1"])
+        with profile_phase("read_matrix"):
+            layers = read_matrix(params["input1"], params["cache"], cache_size)
+            if density is not None:
+                layers = sparsify(layers, density)
         
-        input_vector = read_vector(params["input2"])
+        with profile_phase("read_vectors"):
+            input_vectors = read_vectors(params["input2"])
+
+        with profile_phase("export_network"):
+            export_network(layers, params["output1"], dtype, params["format"])
 
-        serialize_to_xml(layers, params["output1"])
+        with profile_phase("build_layers"):
+            inputs, weights = build_layers(layers, input_vectors, dtype)
+        kernels = resolve_activations(params["activation"], params["kernel"], len(weights))
+        with profile_phase("calculate"):
+            output_vectors = calculate(weights, inputs, kernels)
 
-        output_vector = calculate(layers, input_vector)
+        if dtype != np.float64 or params["kernel"] != "exact":
+            with profile_phase("precision_report"):
+                reference_inputs, reference_weights = build_layers(layers, input_vectors)
+                reference_kernels = resolve_activations(params["activation"], "exact", len(reference_weights))
+                reference = calculate(reference_weights, reference_inputs, reference_kernels)
+                report = precision_report(params["dtype"], params["kernel"], output_vectors, reference)
+                write_precision_report(report, params["output2"])
 
-        with open(params["output2"], "w", encoding="utf-8") as f:
-            f.write(", ".join(map(str, output_vector)))
+        with profile_phase("write_results"), open(params["output2"], "w", encoding="utf-8") as f:
+            f.write("\n".join(", ".join(map(str, row)) for row in output_vectors.tolist()))
 
     except Exception as e:
         write_error(f"Ошибка: {e}")
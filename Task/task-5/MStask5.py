@@ -1,5 +1,34 @@
+import json
+import math
 import numpy as np
+import multiprocessing
+import os
+import queue
 import sys
+import threading
+import time
+from array import array
+from multiprocessing import shared_memory
+
+# Общие модули лежат в каталоге Task/common рядом с каталогами заданий
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import profiling
+from common.activations import resolve_activations, sigmoid, sigmoid_derivative
+from common.cache import CACHE_SIZE, file_digest, store_cache_entry, touch_cache_entry
+from common.precision import DTYPES, compute_dtype, write_precision_report
+from common.profiling import is_enabled, profile_call, profile_layer, profile_path, profile_phase, start_profiling
+from common.weights import (
+    is_binary_weights,
+    is_sparse,
+    layer_dtype,
+    layer_shape,
+    make_sparse,
+    read_binary_weights,
+    read_text_weights,
+    sparse_matmul,
+    sparsify,
+    write_binary_weights,
+)
 
 def parse_arguments():
     args = sys.argv[1:]
@@ -8,7 +37,41 @@ def parse_arguments():
         "output1": "output1.txt", 
         "input2": "input2.txt", 
         "output2": "output2.txt", 
-        "epoch": 10000
+        "epoch": 10000,
+        "batch": 0,
+        "shuffle": 1,
+        "seed": None,
+        "convert": None,
+        "workers": 1,
+        "checkpoint": None,
+        "checkpoint_every": 1000,
+        "keep": 3,
+        "resume": None,
+        "target_loss": None,
+        "patience": 0,
+        "validation": 0,
+        "log_every": 1,
+        "flush_every": 100,
+        "learning_rate": 0.5,
+        "optimizer": "sgd",
+        "momentum": 0.9,
+        "beta1": 0.9,
+        "beta2": 0.999,
+        "rho": 0.9,
+        "schedule": "constant",
+        "decay": 0.5,
+        "step_size": 1000,
+        "min_learning_rate": 0.0,
+        "profile": None,
+        "profile_memory": None,
+        "dtype": "float64",
+        "activation": "sigmoid",
+        "kernel": "exact",
+        "cache": None,
+        "cache_size": 256,
+        "sparse": None,
+        "sweep": None,
+        "sweep_weights": None
     }
     for arg in args:
         key, _, value = arg.partition("=")
@@ -20,21 +83,60 @@ def write_error(message):
     with open("error.txt", 'w', encoding="utf-8") as file:
         file.write(message)
 
-def read_matrix(file_path):
+def layer_values(layer):
+    # Оптимизатор обновляет только хранимые значения: у разреженного слоя это существующие связи
+    return layer["data"] if is_sparse(layer) else layer
+
+def cast_layer(layer, dtype, copy=False):
+    if is_sparse(layer):
+        return dict(layer, data=layer["data"].astype(dtype, copy=copy))
+    return layer.astype(dtype, copy=copy)
+
+def copy_layer(layer):
+    return dict(layer, data=layer["data"].copy()) if is_sparse(layer) else layer.copy()
+
+def sparse_transposed_matmul(deltas, layer, out=None):
+    # deltas @ W: те же связи, сгруппированные по столбцам
+    products = np.multiply(deltas[:, layer["order_rows"]], layer["data"][layer["order"]])
+    if out is None:
+        out = np.empty((deltas.shape[0], layer["shape"][1]), dtype=products.dtype)
+    out.fill(0)
+    if products.shape[1]:
+        out[:, layer["column_nonempty"]] = np.add.reduceat(products, layer["column_starts"], axis=1)
+    return out
+
+def sparse_gradient(deltas, activations, layer, out=None):
+    # Градиент считается только для существующих связей, нулевые веса так и остаются нулевыми
+    return np.einsum("bk,bk->k", deltas[:, layer["rows"]], activations[:, layer["indices"]], out=out)
+
+def sparse_matvec(layer, vector):
+    return sparse_matmul(vector[np.newaxis, :], layer)[0]
+
+def read_weight_arrays(file_path):
+    # Построчный разбор оставляет плотные слои списками строк; обучению нужны массивы,
+    # поэтому непрямоугольный слой здесь же становится ошибкой разбора
+    return [layer if is_sparse(layer) else np.asarray(layer) for layer in read_text_weights(file_path)]
+
+def read_cached_weights(file_path, cache_dir, cache_size):
+    path = os.path.join(cache_dir, f"{file_digest(file_path, 'text-weights')}.nnw")
+    if touch_cache_entry(path):
+        try:
+            return read_binary_weights(path)
+        except (OSError, ValueError):
+            pass
+    layers = read_weight_arrays(file_path)
+    store_cache_entry(cache_dir, path, lambda temporary: write_binary_weights(layers, temporary), cache_size)
+    return layers
+
+def read_matrix(file_path, dtype=np.float64, cache_dir=None, cache_size=CACHE_SIZE):
     try:
-        with open(file_path, 'r') as file:
-            lines = file.readlines()
-        processed_data = []
-        for line in lines:
-            line = line.strip()
-            if line:
-                arrays = line.strip("[]").split("] [")
-                layer = []
-                for array in arrays:
-                    values = [float(value) for value in array.split()]
-                    layer.append(values)
-                processed_data.append(np.array(layer))
-        return processed_data
+        if is_binary_weights(file_path):
+            layers = read_binary_weights(file_path)
+        elif cache_dir:
+            layers = read_cached_weights(file_path, cache_dir, cache_size)
+        else:
+            layers = read_weight_arrays(file_path)
+        return [cast_layer(layer, dtype) for layer in layers]
     except FileNotFoundError:
         write_error(f"Ошибка: Файл '{file_path}' не найден.")
         sys.exit()
@@ -45,7 +147,13 @@ def read_matrix(file_path):
         write_error(f"Ошибка при чтении файла: {e}")
         sys.exit()
 
-def load_training_data(file_path):
+def parse_training_line(line):
+    parts = line.strip("[]").split("] [")
+    input_values = [float(x) for x in parts[0].split()]
+    output_values = [int(x) for x in parts[1].split()]
+    return input_values, output_values
+
+def load_training_data(file_path, dtype=np.float64):
     try:
         inputs, outputs = [], []
         with open(file_path, 'r') as file:
@@ -53,12 +161,10 @@ def load_training_data(file_path):
             for line in lines:
                 line = line.strip()
                 if line:
-                    parts = line.strip("[]").split("] [")
-                    input_values = [float(x) for x in parts[0].split()]
-                    output_values = [int(x) for x in parts[1].split()]
+                    input_values, output_values = parse_training_line(line)
                     inputs.append(input_values)
                     outputs.append(output_values)
-        return np.array(inputs), np.array(outputs)
+        return np.array(inputs, dtype=dtype), np.array(outputs, dtype=dtype)
     except FileNotFoundError:
         write_error(f"Ошибка: Файл '{file_path}' не найден.")
         sys.exit()
@@ -69,54 +175,611 @@ def load_training_data(file_path):
         write_error(f"Ошибка при чтении файла: {e}")
         sys.exit()
 
-def sigmoid(x):
-    return 1 / (1 + np.exp(-x))
+def index_training_data(file_path, dtype=np.float64):
+    try:
+        offsets = array("q")
+        offset = 0
+        with open(file_path, "rb") as file:
+            for line in file:
+                if line.strip():
+                    offsets.append(offset)
+                offset += len(line)
+        return {"path": file_path, "offsets": offsets, "size": len(offsets), "dtype": dtype}
+    except FileNotFoundError:
+        write_error(f"Ошибка: Файл '{file_path}' не найден.")
+        sys.exit()
+    except Exception as e:
+        write_error(f"Ошибка при чтении файла: {e}")
+        sys.exit()
+
+def read_cached_training_data(file_path, cache_dir, cache_size):
+    path = os.path.join(cache_dir, f"{file_digest(file_path, 'training-data')}.nnw")
+    if touch_cache_entry(path):
+        try:
+            inputs, targets = read_binary_weights(path, mode="r")
+            return inputs, targets
+        except (OSError, ValueError):
+            pass
+    inputs, targets = load_training_data(file_path)
+    store_cache_entry(cache_dir, path, lambda temporary: write_binary_weights([inputs, targets], temporary), cache_size)
+    return inputs, targets
+
+def load_dataset(file_path, batch_size, dtype=np.float64, cache_dir=None, cache_size=CACHE_SIZE):
+    try:
+        binary = is_binary_weights(file_path)
+    except FileNotFoundError:
+        write_error(f"Ошибка: Файл '{file_path}' не найден.")
+        sys.exit()
+    if binary:
+        inputs, targets = (data.astype(dtype, copy=False) for data in read_binary_weights(file_path, mode="r"))
+        dataset = {"inputs": inputs, "targets": targets, "size": len(inputs)}
+    elif batch_size <= 0 and cache_dir:
+        cached = read_cached_training_data(file_path, cache_dir, cache_size)
+        inputs, targets = (data.astype(dtype, copy=False) for data in cached)
+        dataset = {"inputs": inputs, "targets": targets, "size": len(inputs)}
+    elif batch_size <= 0:
+        inputs, targets = load_training_data(file_path, dtype)
+        dataset = {"inputs": inputs, "targets": targets, "size": len(inputs)}
+    else:
+        dataset = index_training_data(file_path, dtype)
+    if not dataset["size"]:
+        write_error(f"Ошибка: Обучающая выборка в файле '{file_path}' пуста.")
+        sys.exit()
+    return dataset
+
+def read_training_rows(dataset, indices, file=None):
+    if "offsets" not in dataset:
+        return dataset["inputs"][indices], dataset["targets"][indices]
+    inputs, outputs = [], []
+    for i in np.sort(indices):
+        file.seek(dataset["offsets"][i])
+        input_values, output_values = parse_training_line(file.readline().decode("utf-8").strip())
+        inputs.append(input_values)
+        outputs.append(output_values)
+    return np.array(inputs, dtype=dataset["dtype"]), np.array(outputs, dtype=dataset["dtype"])
 
-def sigmoid_derivative(x):
-    return sigmoid(x) * (1 - sigmoid(x))
+def iter_training_batches(dataset, batch_size, rng=None, prefetch=2):
+    size = dataset["size"]
+    if batch_size <= 0 or batch_size >= size:
+        if rng is None and "offsets" not in dataset:
+            yield dataset["inputs"], dataset["targets"]
+            return
+        batch_size = size
 
-def forward_pass(weights, inputs):
+    order = rng.permutation(size) if rng is not None else np.arange(size)
+    batches = queue.Queue(maxsize=prefetch)
+    stopped = threading.Event()
 
-    activations = [inputs]
-    for layer in weights:
-        inputs = sigmoid(np.dot(inputs, layer.T))
-        activations.append(inputs)
+    def put(item):
+        # Если потребитель перестал читать пакеты, поток не должен вечно ждать места в очереди
+        while not stopped.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            file = open(dataset["path"], "rb") if "offsets" in dataset else None
+            try:
+                for start in range(0, size, batch_size):
+                    if not put(read_training_rows(dataset, order[start:start + batch_size], file)):
+                        return
+            finally:
+                if file:
+                    file.close()
+        except Exception as e:
+            put(e)
+        put(None)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            yield batch
+    finally:
+        stopped.set()
+
+def convert_training_data(file_path, output_path, dtype=np.float64):
+    inputs, targets = load_training_data(file_path, dtype)
+    write_binary_weights([inputs, targets], output_path, dtype)
+
+def allocate_buffers(weights, batch_size):
+    # Плотный слой может нести ведущую ось моделей: слой (K, нейроны, входы) получает буферы (K, пакет, нейроны)
+    dtype = layer_dtype(weights[0])
+    shapes = [(*layer_shape(layer)[:-2], batch_size, layer_shape(layer)[-2]) for layer in weights]
+    return {
+        "activations": [None] + [np.empty(shape, dtype) for shape in shapes],
+        "deltas": [np.empty(shape, dtype) for shape in shapes],
+        "derivatives": [np.empty(shape, dtype) for shape in shapes],
+        "scratch": [np.empty(shape, dtype) for shape in shapes],
+        "gradients": [np.empty(layer_values(layer).shape, dtype) for layer in weights],
+    }
+
+def forward_pass(weights, inputs, buffers, kernels=None):
+    activations = buffers["activations"]
+    activations[0] = inputs
+    for i, layer in enumerate(weights):
+        if profiling.PROFILE is not None:
+            start = time.perf_counter()
+        if is_sparse(layer):
+            sparse_matmul(activations[i], layer, out=activations[i + 1])
+        else:
+            np.matmul(activations[i], layer.swapaxes(-1, -2), out=activations[i + 1])
+        activation = kernels[i][0] if kernels else sigmoid
+        activation(activations[i + 1], out=activations[i + 1], scratch=buffers["scratch"][i])
+        if profiling.PROFILE is not None:
+            profile_layer(i, time.perf_counter() - start)
     return activations
 
-def backward_pass(weights, activations, targets, learning_rate):
-
-    errors = [activations[-1] - targets]
-    deltas = [errors[-1] * sigmoid_derivative(activations[-1])]
-    
-    for i in range(len(weights) - 1, 0, -1):
-        error = np.dot(deltas[-1], weights[i])
-        delta = error * sigmoid_derivative(activations[i])
-        deltas.append(delta)
-    deltas.reverse()
-    
+def compute_gradients(weights, activations, targets, buffers, kernels=None):
+    deltas = buffers["deltas"]
+    derivatives = buffers["derivatives"]
+    scratch = buffers["scratch"]
+    gradients = buffers["gradients"]
+
+    last = len(weights) - 1
+    np.subtract(activations[-1], targets, out=deltas[last])
+    for i in range(last, -1, -1):
+        if i < last and is_sparse(weights[i + 1]):
+            sparse_transposed_matmul(deltas[i + 1], weights[i + 1], out=deltas[i])
+        elif i < last:
+            np.matmul(deltas[i + 1], weights[i + 1], out=deltas[i])
+        derivative = kernels[i][1] if kernels else sigmoid_derivative
+        derivative(activations[i + 1], out=derivatives[i], scratch=scratch[i])
+        np.multiply(deltas[i], derivatives[i], out=deltas[i])
+
+    for i, layer in enumerate(weights):
+        if is_sparse(layer):
+            sparse_gradient(deltas[i], activations[i], layer, out=gradients[i])
+        else:
+            np.matmul(deltas[i].swapaxes(-1, -2), activations[i], out=gradients[i])
+    return gradients
+
+def sgd_update(optimizer, i, weights, gradient, learning_rate):
+    np.multiply(learning_rate, gradient, out=gradient)
+    np.subtract(weights, gradient, out=weights)
+
+def momentum_update(optimizer, i, weights, gradient, learning_rate):
+    velocity = optimizer["state"]["velocity"][i]
+    np.multiply(velocity, optimizer["momentum"], out=velocity)
+    np.add(velocity, gradient, out=velocity)
+    np.multiply(learning_rate, velocity, out=gradient)
+    np.subtract(weights, gradient, out=weights)
+
+def nesterov_update(optimizer, i, weights, gradient, learning_rate):
+    velocity = optimizer["state"]["velocity"][i]
+    scratch = optimizer["state"]["scratch"][i]
+    np.multiply(velocity, optimizer["momentum"], out=velocity)
+    np.add(velocity, gradient, out=velocity)
+    np.multiply(velocity, optimizer["momentum"], out=scratch)
+    np.add(gradient, scratch, out=gradient)
+    np.multiply(learning_rate, gradient, out=gradient)
+    np.subtract(weights, gradient, out=weights)
+
+def rmsprop_update(optimizer, i, weights, gradient, learning_rate):
+    square = optimizer["state"]["square"][i]
+    scratch = optimizer["state"]["scratch"][i]
+    rho = optimizer["rho"]
+    np.square(gradient, out=scratch)
+    np.multiply(scratch, 1 - rho, out=scratch)
+    np.multiply(square, rho, out=square)
+    np.add(square, scratch, out=square)
+    np.sqrt(square, out=scratch)
+    np.add(scratch, optimizer["epsilon"], out=scratch)
+    np.divide(gradient, scratch, out=gradient)
+    np.multiply(learning_rate, gradient, out=gradient)
+    np.subtract(weights, gradient, out=weights)
+
+def adam_update(optimizer, i, weights, gradient, learning_rate):
+    first = optimizer["state"]["first"][i]
+    second = optimizer["state"]["second"][i]
+    scratch = optimizer["state"]["scratch"][i]
+    beta1, beta2, step = optimizer["beta1"], optimizer["beta2"], optimizer["step"]
+    np.multiply(first, beta1, out=first)
+    np.multiply(gradient, 1 - beta1, out=scratch)
+    np.add(first, scratch, out=first)
+    np.square(gradient, out=scratch)
+    np.multiply(scratch, 1 - beta2, out=scratch)
+    np.multiply(second, beta2, out=second)
+    np.add(second, scratch, out=second)
+    np.divide(second, 1 - beta2 ** step, out=scratch)
+    np.sqrt(scratch, out=scratch)
+    np.add(scratch, optimizer["epsilon"], out=scratch)
+    np.divide(first, 1 - beta1 ** step, out=gradient)
+    np.divide(gradient, scratch, out=gradient)
+    np.multiply(learning_rate, gradient, out=gradient)
+    np.subtract(weights, gradient, out=weights)
+
+OPTIMIZERS = {
+    "sgd": (sgd_update, ()),
+    "momentum": (momentum_update, ("velocity",)),
+    "nesterov": (nesterov_update, ("velocity", "scratch")),
+    "rmsprop": (rmsprop_update, ("square", "scratch")),
+    "adam": (adam_update, ("first", "second", "scratch")),
+}
+
+def create_optimizer(name, weights, momentum=0.9, beta1=0.9, beta2=0.999, rho=0.9, epsilon=1e-8):
+    if name not in OPTIMIZERS:
+        raise ValueError(f"неизвестный оптимизатор '{name}'")
+    update, slots = OPTIMIZERS[name]
+    return {
+        "update": update,
+        "state": {slot: [np.zeros(layer_values(layer).shape, dtype=layer_dtype(layer)) for layer in weights] for slot in slots},
+        "step": 0,
+        "momentum": momentum,
+        "beta1": beta1,
+        "beta2": beta2,
+        "rho": rho,
+        "epsilon": epsilon,
+    }
+
+def optimizer_state(optimizer):
+    state = {"step": np.array(optimizer["step"])}
+    for slot, arrays in optimizer["state"].items():
+        if slot != "scratch":
+            state.update({f"{slot}_{i}": values for i, values in enumerate(arrays)})
+    return state
+
+def restore_optimizer(optimizer, state):
+    optimizer["step"] = int(state.get("step", 0))
+    for slot, arrays in optimizer["state"].items():
+        for i, values in enumerate(arrays):
+            if f"{slot}_{i}" in state:
+                values[...] = state[f"{slot}_{i}"]
+
+def constant_schedule(learning_rate, epoch, epochs, decay, step_size, min_learning_rate):
+    return learning_rate
+
+def step_schedule(learning_rate, epoch, epochs, decay, step_size, min_learning_rate):
+    return learning_rate * decay ** (epoch // step_size)
+
+def exponential_schedule(learning_rate, epoch, epochs, decay, step_size, min_learning_rate):
+    # Плавный вариант ступенчатого расписания: за step_size эпох скорость умножается на decay
+    return learning_rate * decay ** (epoch / step_size)
+
+def cosine_schedule(learning_rate, epoch, epochs, decay, step_size, min_learning_rate):
+    return min_learning_rate + 0.5 * (learning_rate - min_learning_rate) * (1 + math.cos(math.pi * epoch / epochs))
+
+SCHEDULES = {
+    "constant": constant_schedule,
+    "step": step_schedule,
+    "exponential": exponential_schedule,
+    "cosine": cosine_schedule,
+}
+
+def apply_gradients(weights, gradients, learning_rate, optimizer):
+    optimizer["step"] += 1
     for i in range(len(weights)):
-        gradient = np.dot(deltas[i].T, activations[i])
-        weights[i] -= learning_rate * gradient
-    
+        optimizer["update"](optimizer, i, layer_values(weights[i]), gradients[i], learning_rate)
+    return weights
+
+def backward_pass(weights, activations, targets, learning_rate, buffers, optimizer, kernels=None):
+    gradients = compute_gradients(weights, activations, targets, buffers, kernels)
+    return apply_gradients(weights, gradients, learning_rate, optimizer)
+
+def squared_error_sum(activations, targets, buffers):
+    squared = buffers["scratch"][-1]
+    np.subtract(activations[-1], targets, out=squared)
+    np.square(squared, out=squared)
+    return squared.sum(axis=(-2, -1))
+
+def train_step(weights, inputs, targets, learning_rate, optimizer, buffer_cache, kernels=None):
+    if len(inputs) not in buffer_cache:
+        buffer_cache[len(inputs)] = allocate_buffers(weights, len(inputs))
+    buffers = buffer_cache[len(inputs)]
+
+    if profiling.PROFILE is None:
+        activations = forward_pass(weights, inputs, buffers, kernels)
+        squared_error = squared_error_sum(activations, targets, buffers)
+        backward_pass(weights, activations, targets, learning_rate, buffers, optimizer, kernels)
+        return squared_error
+
+    start = time.perf_counter()
+    activations = forward_pass(weights, inputs, buffers, kernels)
+    squared_error = squared_error_sum(activations, targets, buffers)
+    middle = time.perf_counter()
+    backward_pass(weights, activations, targets, learning_rate, buffers, optimizer, kernels)
+    profile_call("forward_pass", middle - start)
+    profile_call("backward_pass", time.perf_counter() - middle)
+    return squared_error
+
+def shared_views(shm, layout, dtype=np.float64):
+    dtype = np.dtype(dtype)
+    views = []
+    offset = 0
+    for shape in layout:
+        views.append(np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset))
+        offset += int(np.prod(shape)) * dtype.itemsize
+    return views
+
+def sparse_structure(weights):
+    # В общую память попадают только значения весов, индексы CSR передаются процессам один раз
+    return [dict(layer, data=None) if is_sparse(layer) else None for layer in weights]
+
+def attach_structure(structure, views):
+    return [view if layer is None else dict(layer, data=view) for layer, view in zip(structure, views)]
+
+def training_worker(name, layout, dtype, layers, worker, workers, connection, kernels=None, structure=None):
+    np.seterr(over="ignore")
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        views = shared_views(shm, layout, dtype)
+        weights = attach_structure(structure, views[:layers]) if structure else views[:layers]
+        gradients = views[layers * (worker + 1):layers * (worker + 2)]
+        inputs, targets = views[-2], views[-1]
+        buffer_cache = {}
+        while True:
+            rows = connection.recv()
+            if rows is None:
+                break
+            start, end = rows * worker // workers, rows * (worker + 1) // workers
+            if start == end:
+                for gradient in gradients:
+                    gradient.fill(0)
+                connection.send(0.0)
+                continue
+            if end - start not in buffer_cache:
+                buffer_cache[end - start] = allocate_buffers(weights, end - start)
+                buffer_cache[end - start]["gradients"] = gradients
+            buffers = buffer_cache[end - start]
+
+            try:
+                activations = forward_pass(weights, inputs[start:end], buffers, kernels)
+                squared_error = squared_error_sum(activations, targets[start:end], buffers)
+                compute_gradients(weights, activations, targets[start:end], buffers, kernels)
+                connection.send(squared_error)
+            except Exception as e:
+                connection.send(e)
+    finally:
+        del views, weights, gradients, inputs, targets, buffer_cache
+        shm.close()
+
+def start_training_workers(weights, workers, max_rows, kernels=None):
+    layers = len(weights)
+    dtype = layer_dtype(weights[0])
+    shapes = [layer_values(layer).shape for layer in weights]
+    inputs_shape = (max_rows, layer_shape(weights[0])[1])
+    layout = shapes * (workers + 1) + [inputs_shape, (max_rows, layer_shape(weights[-1])[0])]
+    size = sum(int(np.prod(shape)) for shape in layout) * dtype.itemsize
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    views = shared_views(shm, layout, dtype)
+    for view, layer in zip(views, weights):
+        view[...] = layer_values(layer)
+    structure = sparse_structure(weights) if any(is_sparse(layer) for layer in weights) else None
+
+    connections, processes = [], []
+    for worker in range(workers):
+        parent_end, child_end = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=training_worker,
+            args=(shm.name, layout, dtype.str, layers, worker, workers, child_end, kernels, structure),
+            daemon=True
+        )
+        process.start()
+        connections.append(parent_end)
+        processes.append(process)
+
+    return {
+        "shm": shm,
+        "weights": attach_structure(structure, views[:layers]) if structure else views[:layers],
+        "gradients": [views[layers * (k + 1):layers * (k + 2)] for k in range(workers)],
+        "total": [np.empty(shape, dtype) for shape in shapes],
+        "inputs": views[-2],
+        "targets": views[-1],
+        "connections": connections,
+        "processes": processes,
+        "batch": None,
+    }
+
+def parallel_step(pool, inputs, targets, learning_rate, optimizer):
+    if profiling.PROFILE is not None:
+        start = time.perf_counter()
+    rows = len(inputs)
+    if pool["batch"] is not inputs:
+        pool["inputs"][:rows] = inputs
+        pool["targets"][:rows] = targets
+        pool["batch"] = inputs
+
+    for connection in pool["connections"]:
+        connection.send(rows)
+    results = [connection.recv() for connection in pool["connections"]]
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    squared_error = 0.0
+    for result in results:
+        squared_error += result
+
+    total = pool["total"]
+    for i in range(len(total)):
+        np.copyto(total[i], pool["gradients"][0][i])
+        for gradients in pool["gradients"][1:]:
+            np.add(total[i], gradients[i], out=total[i])
+    apply_gradients(pool["weights"], total, learning_rate, optimizer)
+    if profiling.PROFILE is not None:
+        profile_call("parallel_step", time.perf_counter() - start)
+    return squared_error
+
+def stop_training_workers(pool):
+    for connection in pool["connections"]:
+        connection.send(None)
+    for process in pool["processes"]:
+        process.join()
+    weights = [copy_layer(layer) for layer in pool["weights"]]
+    shm = pool["shm"]
+    pool.clear()
+    shm.close()
+    shm.unlink()
     return weights
 
-def calculate(matrix, vector):
+def calculate(matrix, vector, kernels=None):
 
     output_by_layer = []
 
     for layer_weights in matrix:
-        if layer_weights.shape[1] != vector.shape[0]:
+        if layer_shape(layer_weights)[1] != vector.shape[0]:
             write_error(
                 f"Ошибка: Несоответствие размерностей. "
-                f"Ожидалось: {layer_weights.shape[1]}, получили: {vector.shape[0]}"
+                f"Ожидалось: {layer_shape(layer_weights)[1]}, получили: {vector.shape[0]}"
             )
             sys.exit()
 
-        vector = sigmoid(np.dot(layer_weights, vector))
+        activation = kernels[len(output_by_layer)][0] if kernels else sigmoid
+        if is_sparse(layer_weights):
+            vector = activation(sparse_matvec(layer_weights, vector))
+        else:
+            vector = activation(np.dot(layer_weights, vector))
         output_by_layer.append(vector)
 
     return output_by_layer[-1] if output_by_layer else np.array([])
 
+def list_checkpoints(directory):
+    names = sorted(name for name in os.listdir(directory)
+                   if name.startswith("checkpoint-") and name.endswith(".npz"))
+    return [os.path.join(directory, name) for name in names]
+
+def fsync_directory(directory):
+    # Переименование попадает на диск вместе с записью каталога; в Windows каталог так не открыть
+    if os.name == "nt":
+        return
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+def save_checkpoint(directory, epoch, weights, initial_weights, optimizer_state, rng, progress, keep):
+    os.makedirs(directory, exist_ok=True)
+    arrays = {f"weight_{i}": layer_values(layer) for i, layer in enumerate(weights)}
+    arrays.update({f"initial_{i}": layer_values(layer) for i, layer in enumerate(initial_weights)})
+    for i, layer in enumerate(weights):
+        if is_sparse(layer):
+            arrays.update({f"sparse_shape_{i}": np.array(layer["shape"]), f"sparse_indices_{i}": layer["indices"],
+                           f"sparse_indptr_{i}": layer["indptr"]})
+    arrays.update({f"optimizer_{key}": value for key, value in optimizer_state.items()})
+    arrays["epoch"] = np.array(epoch)
+    arrays["rng"] = np.array(json.dumps(rng.bit_generator.state) if rng is not None else "")
+    arrays.update({f"progress_{key}": np.array(value) for key, value in progress.items()})
+
+    path = os.path.join(directory, f"checkpoint-{epoch:08d}.npz")
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        np.savez(file, **arrays)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+    fsync_directory(directory)
+
+    paths = list_checkpoints(directory)
+    for old_path in paths[:max(len(paths) - keep, 0)]:
+        os.remove(old_path)
+
+def checkpoint_layer(data, prefix, i):
+    if f"sparse_indptr_{i}" not in data.files:
+        return data[f"{prefix}_{i}"]
+    return make_sparse(
+        data[f"sparse_shape_{i}"], data[f"{prefix}_{i}"], data[f"sparse_indices_{i}"], data[f"sparse_indptr_{i}"]
+    )
+
+def load_checkpoint(path):
+    if os.path.isdir(path):
+        checkpoints = list_checkpoints(path)
+        if not checkpoints:
+            raise FileNotFoundError(f"в каталоге '{path}' нет контрольных точек")
+        path = checkpoints[-1]
+    with np.load(path) as data:
+        layers = sum(key.startswith("weight_") for key in data.files)
+        weights = [checkpoint_layer(data, "weight", i) for i in range(layers)]
+        initial_weights = [checkpoint_layer(data, "initial", i) for i in range(layers)]
+        optimizer_state = {key[len("optimizer_"):]: data[key] for key in data.files if key.startswith("optimizer_")}
+        progress = {key[len("progress_"):]: data[key].item() for key in data.files if key.startswith("progress_")}
+        rng_state = str(data["rng"])
+        return {
+            "epoch": int(data["epoch"]),
+            "weights": weights,
+            "initial_weights": initial_weights,
+            "optimizer": optimizer_state,
+            "rng": json.loads(rng_state) if rng_state else None,
+            "progress": progress,
+        }
+
+def split_dataset(dataset, fraction):
+    validation_size = int(dataset["size"] * fraction)
+    if validation_size <= 0:
+        return dataset, None
+    if validation_size >= dataset["size"]:
+        raise ValueError("после выделения проверочной выборки не остаётся примеров для обучения")
+    train_size = dataset["size"] - validation_size
+    parts = []
+    for rows, size in ((slice(None, train_size), train_size), (slice(train_size, None), validation_size)):
+        if "offsets" in dataset:
+            parts.append({"path": dataset["path"], "offsets": dataset["offsets"][rows], "size": size, "dtype": dataset["dtype"]})
+        else:
+            parts.append({"inputs": dataset["inputs"][rows], "targets": dataset["targets"][rows], "size": size})
+    return parts[0], parts[1]
+
+def evaluate_loss(weights, dataset, batch_size, buffer_cache, kernels=None):
+    squared_error, count = 0.0, 0
+    for inputs, targets in iter_training_batches(dataset, batch_size):
+        if len(inputs) not in buffer_cache:
+            buffer_cache[len(inputs)] = allocate_buffers(weights, len(inputs))
+        buffers = buffer_cache[len(inputs)]
+        activations = forward_pass(weights, inputs, buffers, kernels)
+        squared_error += squared_error_sum(activations, targets, buffers)
+        count += len(inputs) * layer_shape(weights[-1])[-2]
+    return squared_error / count
+
+def train_reference(weights, dataset, batch_size, rng, optimizer, learning_rates, kernels=None):
+    # Эталонный прогон повторяет обучение во float64 с точными ядрами: те же веса, порядок примеров и скорости
+    buffer_cache = {}
+    for learning_rate in learning_rates:
+        for inputs, targets in iter_training_batches(dataset, batch_size, rng):
+            train_step(weights, inputs, targets, learning_rate, optimizer, buffer_cache, kernels)
+    return weights
+
+def precision_report(dtype, kernel, weights, dataset, reference_weights, reference_dataset, batch_size, kernels,
+                     reference_kernels):
+    squared_error, reference_squared_error = 0.0, 0.0
+    max_error, total_error, count = 0.0, 0.0, 0
+    batches = zip(iter_training_batches(dataset, batch_size), iter_training_batches(reference_dataset, batch_size))
+    for (inputs, targets), (reference_inputs, reference_targets) in batches:
+        buffers = allocate_buffers(weights, len(inputs))
+        outputs = forward_pass(weights, inputs, buffers, kernels)[-1]
+        squared_error += squared_error_sum(buffers["activations"], targets, buffers)
+        reference_buffers = allocate_buffers(reference_weights, len(reference_inputs))
+        reference = forward_pass(reference_weights, reference_inputs, reference_buffers, reference_kernels)[-1]
+        reference_squared_error += squared_error_sum(reference_buffers["activations"], reference_targets, reference_buffers)
+
+        errors = np.abs(outputs.astype(np.float64) - reference)
+        max_error = max(max_error, float(errors.max()) if errors.size else 0.0)
+        total_error += float(errors.sum())
+        count += errors.size
+    loss = float(squared_error) / count if count else 0.0
+    reference_loss = float(reference_squared_error) / count if count else 0.0
+    return {
+        "dtype": dtype,
+        "kernel": kernel,
+        "compute_dtype": str(compute_dtype(dtype)),
+        "samples": dataset["size"],
+        "loss": loss,
+        "reference_loss": reference_loss,
+        "loss_gap": loss - reference_loss,
+        "max_abs_error": max_error,
+        "mean_abs_error": total_error / count if count else 0.0,
+    }
+
+def check_intervals(**intervals):
+    for name, value in intervals.items():
+        if value < 1:
+            raise ValueError(f"параметр {name} должен быть не меньше 1, получено: {value}")
+
 def train_network(
         input_path1, 
         input_path2, 
@@ -124,70 +787,520 @@ def train_network(
         results_file, 
         epochs,
         learning_rate=0.1, 
+        batch_size=0,
+        shuffle=True,
+        seed=None,
+        workers=1,
+        checkpoint_dir=None,
+        checkpoint_every=1000,
+        keep=3,
+        resume=None,
+        target_loss=None,
+        patience=0,
+        validation=0.0,
+        log_every=1,
+        flush_every=100,
+        optimizer="sgd",
+        momentum=0.9,
+        beta1=0.9,
+        beta2=0.999,
+        rho=0.9,
+        schedule="constant",
+        decay=0.5,
+        step_size=1000,
+        min_learning_rate=0.0,
+        dtype="float64",
+        activation="sigmoid",
+        kernel="exact",
+        cache_dir=None,
+        cache_size=CACHE_SIZE,
+        sparse=None,
     ):
 
-    weights = read_matrix(input_path1)
-    inputs, targets = load_training_data(input_path2)
-    
-    initial_results = [calculate(weights, x) for x in inputs]
+    if optimizer not in OPTIMIZERS:
+        raise ValueError(f"неизвестный оптимизатор '{optimizer}'")
+    if schedule not in SCHEDULES:
+        raise ValueError(f"неизвестное расписание скорости обучения '{schedule}'")
+    if dtype not in DTYPES:
+        raise ValueError(f"неизвестный тип данных '{dtype}'. Допустимые значения: {', '.join(DTYPES)}")
+    if keep < 0:
+        raise ValueError(f"число хранимых контрольных точек не может быть отрицательным: {keep}")
+    if checkpoint_dir is not None and keep < 1:
+        # Иначе каждая точка записывалась бы и сразу удалялась, а resume= нечего было бы загрузить
+        raise ValueError(f"при checkpoint= нужно хранить хотя бы одну контрольную точку: keep={keep}")
+    check_intervals(log_every=log_every, flush_every=flush_every, checkpoint_every=checkpoint_every)
+    storage = np.dtype(dtype)
+    compute = compute_dtype(storage)
+    with profile_phase("load_dataset"):
+        dataset = load_dataset(input_path2, batch_size, storage, cache_dir, cache_size)
+    rng = np.random.default_rng(seed) if shuffle and batch_size > 0 else None
+    start_epoch = 0
+    progress = {"history_offset": 0, "best_loss": np.inf, "stale_epochs": 0}
+
+    if resume:
+        try:
+            with profile_phase("load_checkpoint"):
+                checkpoint = load_checkpoint(resume)
+        except FileNotFoundError:
+            write_error(f"Ошибка: Контрольная точка '{resume}' не найдена.")
+            sys.exit()
+        weights = [cast_layer(layer, compute) for layer in checkpoint["weights"]]
+        initial_weights = [cast_layer(layer, compute) for layer in checkpoint["initial_weights"]]
+        start_epoch = checkpoint["epoch"]
+        progress.update(checkpoint["progress"])
+        if rng is not None and checkpoint["rng"] is not None:
+            rng.bit_generator.state = checkpoint["rng"]
+        print(f"Обучение продолжено с эпохи {start_epoch + 1}")
+    else:
+        with profile_phase("read_matrix"):
+            weights = [
+                cast_layer(layer, compute)
+                for layer in read_matrix(input_path1, storage, cache_dir, cache_size)
+            ]
+        if sparse is not None:
+            weights = sparsify(weights, sparse)
+        initial_weights = [copy_layer(layer) for layer in weights] if checkpoint_dir else []
+    kernels = resolve_activations(activation, kernel, len(weights))
+
+    def iter_inputs():
+        for inputs, _ in iter_training_batches(dataset, batch_size):
+            yield from inputs
 
     try:
-        with open(results_file, 'w', encoding='utf-8') as file:
+        with profile_phase("initial_results"), open(results_file, 'w', encoding='utf-8') as file:
             file.write("Начальные результаты:\n")
-            for i, res in enumerate(initial_results):
-                file.write(f"Пример {i + 1}: {res}\n")
+            for i, x in enumerate(iter_inputs()):
+                file.write(f"Пример {i + 1}: {calculate(initial_weights if resume else weights, x, kernels)}\n")
         print(f"Начальные результаты записаны в файл: {results_file}")
     except Exception as e:
         print(f"Ошибка при записи начальных результатов: {e}")
 
-    history = []
+    train_set, validation_set = split_dataset(dataset, validation)
+    reference = None
+    if storage != np.float64 or kernel != "exact":
+        # Снимок стартового состояния для эталонного обучения во float64, с которым сравнивается отчёт о точности
+        reference_weights = [cast_layer(layer, np.float64, copy=True) for layer in weights]
+        reference = {
+            "weights": reference_weights,
+            "optimizer": create_optimizer(optimizer, reference_weights, momentum, beta1, beta2, rho),
+            "rng": None,
+            "learning_rates": [],
+        }
+        if rng is not None:
+            reference["rng"] = np.random.default_rng()
+            reference["rng"].bit_generator.state = rng.bit_generator.state
+        if resume:
+            restore_optimizer(reference["optimizer"], checkpoint["optimizer"])
+    optimizer = create_optimizer(optimizer, weights, momentum, beta1, beta2, rho)
+    if resume:
+        restore_optimizer(optimizer, checkpoint["optimizer"])
+    buffer_cache = {}
+    pool = None
+    if workers > 1:
+        max_rows = batch_size if 0 < batch_size < train_set["size"] else train_set["size"]
+        with profile_phase("start_training_workers"):
+            pool = start_training_workers(weights, workers, max_rows, kernels)
 
-    for epoch in range(epochs):
-        activations = forward_pass(weights, inputs)
+    history = None
+    try:
+        history = open(history_file, 'a', encoding='utf-8', buffering=1 << 16)
+        history.truncate(progress["history_offset"])
+    except Exception as e:
+        print(f"Ошибка при записи истории обучения: {e}")
+    separator = "\n" if progress["history_offset"] else ""
 
-        outputs = activations[-1]  
+    try:
+        for epoch in range(start_epoch, epochs):
+            squared_error, count = 0.0, 0
+            epoch_learning_rate = SCHEDULES[schedule](
+                learning_rate, epoch, epochs, decay, step_size, min_learning_rate
+            )
+            if reference:
+                reference["learning_rates"].append(epoch_learning_rate)
 
-        error = np.mean((outputs - targets) ** 2)
-        history.append(f"Эпоха {epoch + 1}: ошибка = {error}")
+            if profiling.PROFILE is not None:
+                epoch_start = time.perf_counter()
 
-        weights = backward_pass(
-            weights, 
-            activations, 
-            targets, 
-            learning_rate
-        )
+            for inputs, targets in iter_training_batches(train_set, batch_size, rng):
+                if pool:
+                    squared_error += parallel_step(pool, inputs, targets, epoch_learning_rate, optimizer)
+                else:
+                    squared_error += train_step(
+                        weights, inputs, targets, epoch_learning_rate, optimizer, buffer_cache, kernels
+                    )
+                count += len(inputs) * layer_shape(weights[-1])[0]
+
+            current_weights = pool["weights"] if pool else weights
+            error = squared_error / count
+            line = f"Эпоха {epoch + 1}: ошибка = {error}"
+            loss = error
+            if validation_set:
+                with profile_phase("evaluate_loss"):
+                    loss = evaluate_loss(current_weights, validation_set, batch_size, buffer_cache, kernels)
+                line += f", ошибка на проверке = {loss}"
+            if profiling.PROFILE is not None:
+                profiling.PROFILE.setdefault("epochs", []).append(
+                    {"epoch": epoch + 1, "seconds": time.perf_counter() - epoch_start, "loss": float(loss)}
+                )
+
+            if loss < progress["best_loss"]:
+                progress["best_loss"] = loss
+                progress["stale_epochs"] = 0
+            else:
+                progress["stale_epochs"] += 1
+            stop = (
+                (target_loss is not None and loss <= target_loss)
+                or (patience > 0 and progress["stale_epochs"] >= patience)
+            )
+
+            if history and ((epoch + 1) % log_every == 0 or stop or epoch + 1 == epochs):
+                history.write(separator + line)
+                separator = "\n"
+            if history and (epoch + 1) % flush_every == 0:
+                history.flush()
+
+            if checkpoint_dir and (epoch + 1) % checkpoint_every == 0:
+                if history:
+                    history.flush()
+                    progress["history_offset"] = history.tell()
+                with profile_phase("save_checkpoint"):
+                    save_checkpoint(
+                        checkpoint_dir, epoch + 1, current_weights, initial_weights,
+                        optimizer_state(optimizer), rng, progress, keep
+                    )
+
+            if stop:
+                print(f"Обучение остановлено на эпохе {epoch + 1}: ошибка = {loss}")
+                break
+    finally:
+        if pool:
+            weights = stop_training_workers(pool)
+        if history:
+            history.close()
+            print(f"История обучения сохранена в файл: {history_file}")
+
+    try:
+        with profile_phase("final_results"), open(results_file, 'a', encoding='utf-8') as file:
+            file.write("\nФинальные результаты:\n")
+            for i, x in enumerate(iter_inputs()):
+                file.write(f"Пример {i + 1}: {calculate(weights, x, kernels)}\n")
+        print(f"Финальные результаты записаны в файл: {results_file}")
+    except Exception as e:
+        print(f"Ошибка при записи конечных результатов: {e}")
+
+    if reference:
+        with profile_phase("precision_report"):
+            reference_dataset = load_dataset(input_path2, batch_size, cache_dir=cache_dir, cache_size=cache_size)
+            reference_train_set, _ = split_dataset(reference_dataset, validation)
+            reference_kernels = resolve_activations(activation, "exact", len(weights))
+            reference_weights = train_reference(
+                reference["weights"], reference_train_set, batch_size, reference["rng"], reference["optimizer"],
+                reference["learning_rates"], reference_kernels
+            )
+            report = precision_report(
+                dtype, kernel, weights, dataset, reference_weights, reference_dataset, batch_size, kernels,
+                reference_kernels
+            )
+            write_precision_report(report, results_file)
+
+    return weights
+
+def sweep_path(path, model):
+    stem, extension = os.path.splitext(path)
+    return f"{stem}.model{model + 1}{extension}"
+
+def load_sweep_weights(weight_files, count, storage, compute, cache_dir=None, cache_size=CACHE_SIZE):
+    models = [read_matrix(path, storage, cache_dir, cache_size) for path in weight_files]
+    for k, layers in enumerate(models):
+        if any(is_sparse(layer) for layer in layers):
+            raise ValueError(f"разреженные слои модели {k + 1} не поддерживаются в режиме перебора")
+        if [layer.shape for layer in layers] != [layer.shape for layer in models[0]]:
+            raise ValueError(f"размеры слоёв модели {k + 1} не совпадают с размерами первой модели")
+    if len(models) == 1:
+        models *= count
+    return [np.stack([layers[i] for layers in models]).astype(compute) for i in range(len(models[0]))]
+
+def train_sweep(
+        input_path1,
+        input_path2,
+        history_file,
+        results_file,
+        epochs,
+        learning_rates,
+        weight_files=(),
+        batch_size=0,
+        shuffle=True,
+        seed=None,
+        target_loss=None,
+        patience=0,
+        validation=0.0,
+        log_every=1,
+        flush_every=100,
+        optimizer="sgd",
+        momentum=0.9,
+        beta1=0.9,
+        beta2=0.999,
+        rho=0.9,
+        schedule="constant",
+        decay=0.5,
+        step_size=1000,
+        min_learning_rate=0.0,
+        dtype="float64",
+        activation="sigmoid",
+        kernel="exact",
+        cache_dir=None,
+        cache_size=CACHE_SIZE,
+    ):
+
+    if optimizer not in OPTIMIZERS:
+        raise ValueError(f"неизвестный оптимизатор '{optimizer}'")
+    if schedule not in SCHEDULES:
+        raise ValueError(f"неизвестное расписание скорости обучения '{schedule}'")
+    if dtype not in DTYPES:
+        raise ValueError(f"неизвестный тип данных '{dtype}'. Допустимые значения: {', '.join(DTYPES)}")
+    check_intervals(log_every=log_every, flush_every=flush_every)
+    weight_files = list(weight_files) or [input_path1]
+    count = max(len(learning_rates), len(weight_files))
+    if len(learning_rates) not in (1, count) or len(weight_files) not in (1, count):
+        raise ValueError("число скоростей обучения и файлов весов в переборе не совпадает")
+    if len(learning_rates) == 1:
+        learning_rates = learning_rates * count
+    if len(weight_files) == 1:
+        weight_files = weight_files * count
+
+    storage = np.dtype(dtype)
+    compute = compute_dtype(storage)
+    with profile_phase("load_dataset"):
+        dataset = load_dataset(input_path2, batch_size, storage, cache_dir, cache_size)
+    rng = np.random.default_rng(seed) if shuffle and batch_size > 0 else None
+    with profile_phase("read_matrix"):
+        weights = load_sweep_weights(weight_files, count, storage, compute, cache_dir, cache_size)
+    kernels = resolve_activations(activation, kernel, len(weights))
+
+    def iter_inputs():
+        for inputs, _ in iter_training_batches(dataset, batch_size):
+            yield from inputs
+
+    def write_results(title, mode):
+        for k in range(count):
+            model_weights = [layer[k] for layer in weights]
+            path = sweep_path(results_file, k)
+            with open(path, mode, encoding="utf-8") as file:
+                file.write(title)
+                for i, x in enumerate(iter_inputs()):
+                    file.write(f"Пример {i + 1}: {calculate(model_weights, x, kernels)}\n")
+
+    try:
+        with profile_phase("initial_results"):
+            write_results("Начальные результаты:\n", "w")
+        print(f"Начальные результаты {count} моделей записаны в файлы: {sweep_path(results_file, 0)} ...")
+    except Exception as e:
+        print(f"Ошибка при записи начальных результатов: {e}")
 
+    train_set, validation_set = split_dataset(dataset, validation)
+    optimizer_name = optimizer
+    optimizer = create_optimizer(optimizer, weights, momentum, beta1, beta2, rho)
+    rates = np.array(learning_rates, dtype=np.float64).reshape(-1, 1, 1)
+    active = np.ones(count, dtype=bool)
+    best_loss = np.full(count, np.inf)
+    stale_epochs = np.zeros(count, dtype=int)
+    last_loss = np.full(count, np.nan)
+    trained_epochs = np.zeros(count, dtype=int)
+    buffer_cache = {}
+
+    histories = []
     try:
-        with open(history_file, 'w', encoding='utf-8') as file:
-            file.write("\n".join(history))
-        print(f"История обучения сохранена в файл: {history_file}")
+        histories = [open(sweep_path(history_file, k), "w", encoding="utf-8", buffering=1 << 16) for k in range(count)]
     except Exception as e:
         print(f"Ошибка при записи истории обучения: {e}")
+    separators = [""] * count
+
+    try:
+        for epoch in range(epochs):
+            squared_error, rows = 0.0, 0
+            # Остановившиеся модели продолжают считаться в общем пакете, но с нулевой скоростью обучения
+            epoch_rates = SCHEDULES[schedule](
+                rates, epoch, epochs, decay, step_size, min_learning_rate
+            ) * active.reshape(-1, 1, 1)
+
+            if profiling.PROFILE is not None:
+                epoch_start = time.perf_counter()
+
+            for inputs, targets in iter_training_batches(train_set, batch_size, rng):
+                # Веса уложены по ведущей оси моделей, а epoch_rates формы (K, 1, 1) задаёт скорость каждой модели
+                squared_error = squared_error + train_step(
+                    weights, inputs, targets, epoch_rates, optimizer, buffer_cache, kernels
+                )
+                rows += len(inputs) * layer_shape(weights[-1])[-2]
+
+            errors = squared_error / rows
+            losses = errors
+            if validation_set:
+                with profile_phase("evaluate_loss"):
+                    losses = evaluate_loss(weights, validation_set, batch_size, buffer_cache, kernels)
+            if profiling.PROFILE is not None:
+                profiling.PROFILE.setdefault("epochs", []).append(
+                    {"epoch": epoch + 1, "seconds": time.perf_counter() - epoch_start,
+                     "loss": [float(loss) for loss in losses]}
+                )
 
-    final_results = [calculate(weights, x) for x in inputs]
+            for k in np.flatnonzero(active):
+                loss = losses[k]
+                last_loss[k] = loss
+                trained_epochs[k] = epoch + 1
+                if loss < best_loss[k]:
+                    best_loss[k] = loss
+                    stale_epochs[k] = 0
+                else:
+                    stale_epochs[k] += 1
+                stop = (
+                    (target_loss is not None and loss <= target_loss)
+                    or (patience > 0 and stale_epochs[k] >= patience)
+                )
+
+                line = f"Эпоха {epoch + 1}: ошибка = {errors[k]}"
+                if validation_set:
+                    line += f", ошибка на проверке = {loss}"
+                if histories and ((epoch + 1) % log_every == 0 or stop or epoch + 1 == epochs):
+                    histories[k].write(separators[k] + line)
+                    separators[k] = "\n"
+                if histories and (epoch + 1) % flush_every == 0:
+                    histories[k].flush()
+                if stop:
+                    active[k] = False
+                    print(f"Обучение модели {k + 1} остановлено на эпохе {epoch + 1}: ошибка = {loss}")
+
+            if not active.any():
+                break
+    finally:
+        for history in histories:
+            history.close()
+        if histories:
+            print(f"История обучения {count} моделей сохранена в файлы: {sweep_path(history_file, 0)} ...")
 
     try:
-        with open(results_file, 'a', encoding='utf-8') as file:
-            file.write("\nФинальные результаты:\n")
-            for i, res in enumerate(final_results):
-                file.write(f"Пример {i + 1}: {res}\n")
-        print(f"Финальные результаты записаны в файл: {results_file}")
+        with profile_phase("final_results"):
+            write_results("\nФинальные результаты:\n", "a")
+        print(f"Финальные результаты {count} моделей записаны в файлы: {sweep_path(results_file, 0)} ...")
     except Exception as e:
         print(f"Ошибка при записи конечных результатов: {e}")
 
+    report = {
+        "optimizer": optimizer_name,
+        "schedule": schedule,
+        "dtype": dtype,
+        "models": [
+            {
+                "model": k + 1,
+                "learning_rate": learning_rates[k],
+                "weights": weight_files[k],
+                "epochs": int(trained_epochs[k]),
+                "loss": float(last_loss[k]),
+                "best_loss": float(best_loss[k]),
+                "history": sweep_path(history_file, k),
+                "results": sweep_path(results_file, k),
+            }
+            for k in range(count)
+        ],
+    }
+    report["best_model"] = min(report["models"], key=lambda model: model["best_loss"])["model"]
+    report_path = f"{os.path.splitext(results_file)[0]}.sweep.json"
+    with open(report_path, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"Сводка перебора записана в {report_path}: лучшая модель {report['best_model']}")
+
     return weights
 
 def main():
     params = parse_arguments()
+    report_path = profile_path(params["profile"], params["output2"])
+    if report_path:
+        start_profiling(report_path, is_enabled(params["profile_memory"]))
+    # Переполнение exp даёт корректный предел активации, предупреждения numpy только засоряют вывод
+    np.seterr(over="ignore")
 
     try:
+        if params["convert"]:
+            if params["dtype"] not in DTYPES:
+                raise ValueError(f"неизвестный тип данных '{params['dtype']}'. Допустимые значения: {', '.join(DTYPES)}")
+            convert_training_data(params["input2"], params["convert"], params["dtype"])
+            print(f"Обучающая выборка записана в файл: {params['convert']}")
+            return
+
+        if params["sweep"] or params["sweep_weights"]:
+            unsupported = [name for name in ("checkpoint", "resume", "sparse") if params[name] is not None]
+            if int(params["workers"]) > 1:
+                unsupported.insert(0, "workers")
+            if unsupported:
+                raise ValueError(f"параметры {', '.join(unsupported)} не поддерживаются в режиме перебора")
+            train_sweep(
+                params["input1"],
+                params["input2"],
+                params["output1"],
+                params["output2"],
+                epochs=int(params["epoch"]),
+                learning_rates=[float(value) for value in (params["sweep"] or params["learning_rate"]).split(",")],
+                weight_files=[path.strip() for path in params["sweep_weights"].split(",")] if params["sweep_weights"] else (),
+                batch_size=int(params["batch"]),
+                shuffle=bool(int(params["shuffle"])),
+                seed=int(params["seed"]) if params["seed"] is not None else None,
+                target_loss=float(params["target_loss"]) if params["target_loss"] is not None else None,
+                patience=int(params["patience"]),
+                validation=float(params["validation"]),
+                log_every=int(params["log_every"]),
+                flush_every=int(params["flush_every"]),
+                optimizer=params["optimizer"],
+                momentum=float(params["momentum"]),
+                beta1=float(params["beta1"]),
+                beta2=float(params["beta2"]),
+                rho=float(params["rho"]),
+                schedule=params["schedule"],
+                decay=float(params["decay"]),
+                step_size=int(params["step_size"]),
+                min_learning_rate=float(params["min_learning_rate"]),
+                dtype=params["dtype"],
+                activation=params["activation"],
+                kernel=params["kernel"],
+                cache_dir=params["cache"],
+                cache_size=int(float(params["cache_size"]) * (1 << 20))
+            )
+            return
+
         train_network(
             params["input1"], 
             params["input2"], 
             params["output1"], 
             params["output2"], 
             epochs=int(params["epoch"]),
-            learning_rate=0.5
+            learning_rate=float(params["learning_rate"]),
+            batch_size=int(params["batch"]),
+            shuffle=bool(int(params["shuffle"])),
+            seed=int(params["seed"]) if params["seed"] is not None else None,
+            workers=int(params["workers"]),
+            checkpoint_dir=params["checkpoint"],
+            checkpoint_every=int(params["checkpoint_every"]),
+            keep=int(params["keep"]),
+            resume=params["resume"],
+            target_loss=float(params["target_loss"]) if params["target_loss"] is not None else None,
+            patience=int(params["patience"]),
+            validation=float(params["validation"]),
+            log_every=int(params["log_every"]),
+            flush_every=int(params["flush_every"]),
+            optimizer=params["optimizer"],
+            momentum=float(params["momentum"]),
+            beta1=float(params["beta1"]),
+            beta2=float(params["beta2"]),
+            rho=float(params["rho"]),
+            schedule=params["schedule"],
+            decay=float(params["decay"]),
+            step_size=int(params["step_size"]),
+            min_learning_rate=float(params["min_learning_rate"]),
+            dtype=params["dtype"],
+            activation=params["activation"],
+            kernel=params["kernel"],
+            cache_dir=params["cache"],
+            cache_size=int(float(params["cache_size"]) * (1 << 20)),
+            sparse=float(params["sparse"]) if params["sparse"] is not None else None
         )
     except Exception as e:
         write_error(f"Ошибка: {e}")